@@ -31,8 +31,8 @@ def main():
     create_folders(dirs)
 
     fetch_and_write_files(dirs)
-    initial_filtering(dirs)
-    fetcher = UniProtFetcher(dirs)
+    initial_filtering(dirs, chunksize=500000)
+    fetcher = UniProtFetcher(dirs, workers=4, batch_size=500)
     fetcher.fetch_fasta_files()
     second_filtering(dirs)
     final_filtering(dirs)
@@ -7,6 +7,7 @@ import os
 from pdb.fetch_obsolete import fetch_obsolete
 from pdb.fetch_xray import fetch_xray
 from pdb.lib.data_paths import ProjectFolders
+from pdb.lib.file_io import id_set_path
 from pdb.fetch_pdb_chain_uni import fetch_pdb_chain_uniprot
 
 
@@ -31,12 +32,12 @@ def fetch_and_write_files(dirs):
     assert dirs.working
 
     # Run unit test for this manually to not overload servers.
-    obs_fp = os.path.join(dirs.working, 'obs.yaml')
+    obs_fp = id_set_path(dirs.working, 'obs')
     if not os.path.exists(obs_fp):
         fetch_obsolete(obs_fp)
 
     # Run unit test for this manually to not overload servers.
-    xray_fp = os.path.join(dirs.working, 'xray.yaml')
+    xray_fp = id_set_path(dirs.working, 'xray')
     if not os.path.exists(xray_fp):
         fetch_xray(xray_fp)
 
@@ -7,24 +7,28 @@ import requests
 import xml.etree.ElementTree as ETree
 
 from os.path import isfile, basename
-from pdb.lib.file_io import write_yaml
+from pdb.lib.file_io import write_id_set, write_yaml
 
 
 def fetch_obsolete(
         obs_file_path,
         url='http://www.rcsb.org/pdb/rest/getObsolete',
-        force_download=False
+        force_download=False,
+        yaml_fp=None
 ):
     """Fetch list of obsolete entries.
 
     Fetch list of obsolete entries, process, and write
-    results to a yaml file.
+    results to an ID file.
 
     Args:
-        obs_file_path (Unicode): The destination yaml file to be written.
+        obs_file_path (Unicode): The destination ID file to be written
+            (see pdb.lib.file_io.write_id_set).
         url (Unicode):  The url address of the data.
         force_download (bool): If true, download the file even it
             the path already exists locally.
+        yaml_fp (Unicode): If given, also write the list to this yaml
+            file.
 
     Returns:
         None
@@ -44,5 +48,7 @@ def fetch_obsolete(
         for child in root:
             obs.append(child.attrib['structureId'].upper())
         obs_req.close()
-        write_yaml(obs, obs_file_path)
+        write_id_set(obs, obs_file_path)
+        if yaml_fp:
+            write_yaml(sorted(set(obs)), yaml_fp)
     return None
@@ -4,6 +4,11 @@
 Validate ss_dis data files. Download and/or regenerate if necessary.
 Then return a dictionary of ss_dis data.
 
+Loaded ss_dis data is cached for the life of the process, so pipeline
+stages that run in the same process share one copy. The cache is keyed
+on the resolved path, modification time and size of the index file and
+is invalidated whenever an index file is archived or written.
+
 """
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
@@ -19,7 +24,8 @@ from collections import namedtuple
 from io import open
 
 from pdb.lib.datetime_info import now_utc
-from pdb.lib.file_io import read_json, write_json
+from pdb.lib.ss_dis_index import (
+    SsDisMapping, SsDisView, read_ss_index, write_ss_index)
 
 
 __ss_dis_pattern__ = """
@@ -40,13 +46,96 @@ __ss_dis_pattern__ = """
     (          # Start Group 3.
     (?:txt)    # The extension "txt."
     |          # OR
-    (?:json)   # The extension "json."
+    (?:bin)    # The extension "bin."
+    |          # OR
+    (?:json)   # The extension "json." (Superseded companion format.)
     )          # End Group 3.
     $          # Anchor to end of line.
 """
 SS_DIS_PAT = re.compile(__ss_dis_pattern__, re.VERBOSE)
 
-SS_File_Names = namedtuple('ss_dis_files', ['raw', 'json'])
+SS_File_Names = namedtuple('ss_dis_files', ['raw', 'bin'])
+
+SS_Record = namedtuple(
+    'ss_dis_record', ['pdb_chain', 'sequence', 'secstr', 'disorder'])
+
+# (real path, mtime, size, lazy) -> loaded ss_dis data.
+_SS_DIS_CACHE = {}
+
+# (real dir path, lazy) -> (dir mtime, real index path) of the last call.
+_SS_DIS_DIRS = {}
+
+
+def _file_key(file_path):
+    """Return the (real path, mtime, size) cache key of a file."""
+    real_path = os.path.realpath(file_path)
+    file_stat = os.stat(real_path)
+    return real_path, file_stat.st_mtime, file_stat.st_size
+
+
+def _close_ss_dis_data(ss_dis_data):
+    """Close cached ss_dis data if it holds open file handles."""
+    if isinstance(ss_dis_data, SsDisMapping):
+        ss_dis_data.close()
+    return None
+
+
+def _invalidate_ss_dis_cache(file_path):
+    """Drop and close cached data loaded from the specified file path.
+
+    Cached mappings for the file are closed, so callers must not keep
+    reading from a mapping after its file has been archived or replaced.
+
+    Args:
+        file_path (Unicode): The path of an ss_dis file that is being
+            archived or replaced.
+
+    Returns:
+        None
+
+    """
+    real_path = os.path.realpath(file_path)
+    for cache_key in list(_SS_DIS_CACHE):
+        if cache_key[0] == real_path:
+            _close_ss_dis_data(_SS_DIS_CACHE.pop(cache_key))
+    for dir_key, dir_entry in list(_SS_DIS_DIRS.items()):
+        if dir_entry[1] == real_path:
+            del _SS_DIS_DIRS[dir_key]
+    return None
+
+
+def clear_ss_dis_cache():
+    """Drop all ss_dis data cached by fetch_ss_dis and close mappings.
+
+    Returns:
+        None
+
+    """
+    for ss_dis_data in _SS_DIS_CACHE.values():
+        _close_ss_dis_data(ss_dis_data)
+    _SS_DIS_CACHE.clear()
+    _SS_DIS_DIRS.clear()
+    return None
+
+
+def _cached_for_dir(working_path, lazy):
+    """Return cached ss_dis data for a directory, or None.
+
+    The cached data is only returned if the directory has not changed
+    since it was last scanned and the index file it resolved to is
+    unchanged, so the directory scan and pairing can be skipped.
+
+    """
+    dir_entry = _SS_DIS_DIRS.get((os.path.realpath(working_path), lazy))
+    if dir_entry is None:
+        return None
+    dir_mtime, bin_path = dir_entry
+    try:
+        if os.stat(working_path).st_mtime != dir_mtime:
+            return None
+        return _SS_DIS_CACHE.get(_file_key(bin_path) + (lazy,))
+    except OSError:
+        return None
 
 
 def _find_ss_data(dir_path):
@@ -175,28 +264,29 @@ def _archive_ss_data(original_file_path):
     finally:
         assert os.path.isfile(archive_fp)
 
+    _invalidate_ss_dis_cache(original_file_path)
     return None
 
 
 def _find_matching_datetime_pairs(sorted_dis_names):
-    """Find a ss_dst json and text file with the same timestamp.
+    """Find a ss_dis binary index and text file with the same timestamp.
 
     The ss_dis.txt file from the PDB database isn't used directly; it
-    is read, processed, and then turned into a dictionary.
-    That dictionary, with modified data, is stored as a json file
-    for future use.
+    is read, processed, and then written to a binary index file
+    (see pdb.lib.ss_dis_index) for future use.
 
-    The ss_dis text file is kept to enable regeneration of the json
+    The ss_dis text file is kept to enable regeneration of the index
     file without downloading the data again. (This is also helpful
     for unit testing so that servers aren't overloaded.)
 
-    To ensure consistency, the dictionary of modified ss_dis is never
-    returned directly (which it could be after writing the json
+    To ensure consistency, the processed ss_dis data is never
+    returned directly (which it could be after writing the index
     for the first time. Instead, the data is always read from the
-    json file.
+    index file.
 
-    Both the json and text file are written with a timestamp to
-    assert that files belong to the same set of data.
+    Both the index and text file are written with a timestamp to
+    assert that files belong to the same set of data. JSON files
+    written by earlier versions are never paired and are archived.
 
     Args:
         sorted_dis_names (list): A list of ss_dis filenames (not path
@@ -207,19 +297,19 @@ def _find_matching_datetime_pairs(sorted_dis_names):
             following keys:
 
             valid_raw_file (Unicode):
-                A ss_dis text file with a matching json file.
-            valid_json_file (Unicode):
-                A ss_dis json file with a matching txt (raw data) file.
+                A ss_dis text file with a matching index file.
+            valid_bin_file (Unicode):
+                A ss_dis index file with a matching txt (raw data) file.
             files_to_archive (list):
                 A list of files names with no matching paris, or that
-                are older than the valid_raw_file/valid_json_file,
+                are older than the valid_raw_file/valid_bin_file,
                 that should be moved to the backup directory.
 
     """
     sorted_dis_names = list(sorted_dis_names)
     match_results = {
         'valid_raw_file': None,
-        'valid_json_file': None,
+        'valid_bin_file': None,
         'files_to_archive': []
     }
     while len(sorted_dis_names) >= 2:
@@ -238,7 +328,7 @@ def _find_matching_datetime_pairs(sorted_dis_names):
             sorted_dis_names.pop(0)
             continue
 
-        if 'json' not in extensions or 'txt' not in extensions:
+        if 'bin' not in extensions or 'txt' not in extensions:
             match_results['files_to_archive'].append(sorted_dis_names[0])
             sorted_dis_names.pop(0)
             continue
@@ -249,10 +339,10 @@ def _find_matching_datetime_pairs(sorted_dis_names):
         if first_extension == 'txt':
             match_results['valid_raw_file'] = sorted_dis_names.pop(0)
             # Reference the next file directly because we used pop().
-            assert SS_DIS_PAT.search(sorted_dis_names[0]).group(3) == 'json'
-            match_results['valid_json_file'] = sorted_dis_names.pop(0)
-        elif first_extension == 'json':
-            match_results['valid_json_file'] = sorted_dis_names.pop(0)
+            assert SS_DIS_PAT.search(sorted_dis_names[0]).group(3) == 'bin'
+            match_results['valid_bin_file'] = sorted_dis_names.pop(0)
+        elif first_extension == 'bin':
+            match_results['valid_bin_file'] = sorted_dis_names.pop(0)
             # Reference the next file directly because we used pop().
             assert SS_DIS_PAT.search(sorted_dis_names[0]).group(3) == 'txt'
             match_results['valid_raw_file'] = sorted_dis_names.pop(0)
@@ -268,10 +358,10 @@ def _find_matching_datetime_pairs(sorted_dis_names):
     # If two matching files haven't been found, return the most
     # recent raw txt file, if one exists.
     if not match_results['valid_raw_file']:
-        assert not match_results['valid_json_file']
+        assert not match_results['valid_bin_file']
         match_results['files_to_archive'].sort(reverse=True)
         for archive_file in match_results['files_to_archive']:
-            if SS_DIS_PAT.search(sorted_dis_names[0]).group(3) == 'txt':
+            if SS_DIS_PAT.search(archive_file).group(3) == 'txt':
                 match_results['valid_raw_file'] = archive_file
                 # Remove this file from the archive list
                 # because it will now be used.
@@ -282,12 +372,12 @@ def _find_matching_datetime_pairs(sorted_dis_names):
 
 
 def _new_filenames():
-    """Create text and json filenames with matching timestamps.
+    """Create text and index filenames with matching timestamps.
 
     Returns:
         new_filenames (SS_Names): A named 2-tuple where raw is the
-            filename of the new text file and json is the name
-            of the matching (datetime) json file.
+            filename of the new text file and bin is the name
+            of the matching (datetime) binary index file.
 
     """
     timestamp = now_utc()
@@ -296,12 +386,12 @@ def _new_filenames():
         timestamp,
         'txt'
     )
-    yfn = "{}.{}.{}".format(
+    bfn = "{}.{}.{}".format(
         'ss_dis',
         timestamp,
-        'json'
+        'bin'
     )
-    new_filenames = SS_File_Names(raw=rfn, json=yfn)
+    new_filenames = SS_File_Names(raw=rfn, bin=bfn)
     return new_filenames
 
 
@@ -329,6 +419,63 @@ def _download_ss_data(
     return None
 
 
+def _iter_ss_records(ss_raw_data_filepath):
+    """Yield one processed record per PDB chain in a ss_dis text file.
+
+    The file is read once, line by line through the buffered file
+    handle, so only the lines of the chain currently being parsed are
+    held in memory. The lines of each sequence, secstr and disorder
+    entry are collected in a list and joined once the entry is complete.
+
+    Args:
+        ss_raw_data_filepath (Unicode): The file path of the ss_dis file.
+
+    Yields:
+        record (SS_Record): A named 4-tuple of the form
+            (pdb_chain, sequence, secstr, disorder). Entries that are
+            absent from the file for a chain are empty strings.
+
+    """
+    current_chain = None
+    fields = {}
+    ltype = None
+    lines = []
+    with open(ss_raw_data_filepath, 'r', encoding='utf-8') as raw_fh:
+        for line in raw_fh:
+            if line[0] == '>':
+                if ltype is not None:
+                    fields[ltype] = ''.join(lines)
+                header_info = line.split(':')
+                pdb_chain = ''.join([
+                    header_info[0][1:].upper(),
+                    '_',
+                    header_info[1]
+                ])
+                if pdb_chain != current_chain:
+                    if current_chain is not None:
+                        yield _create_ss_record(current_chain, fields)
+                    current_chain = pdb_chain
+                    fields = {}
+                ltype = header_info[2].rstrip()
+                lines = []
+            else:
+                lines.append(line.rstrip('\n'))
+
+    if ltype is not None:
+        fields[ltype] = ''.join(lines)
+        yield _create_ss_record(current_chain, fields)
+
+
+def _create_ss_record(pdb_chain, fields):
+    """Return a SS_Record for the entries collected for one chain."""
+    return SS_Record(
+        pdb_chain=pdb_chain,
+        sequence=fields.get('sequence', ''),
+        secstr=fields.get('secstr', ''),
+        disorder=fields.get('disorder', '')
+    )
+
+
 def _generate_ss_dict(ss_raw_data_filepath):
     """Read ss_raw_data_filepath.txt into a dictionary and return.
 
@@ -349,63 +496,21 @@ def _generate_ss_dict(ss_raw_data_filepath):
 
     """
     pdb_dict = {}
-    with open(ss_raw_data_filepath, 'r', encoding='utf-8') as raw_fh:
-        ss_data = raw_fh.readlines()
-        for line in ss_data:
-            if line[0] == '>':
-                header_info = line.split(':')
-                pdb = header_info[0][1:].upper()
-                chain = header_info[1]
-                outer_key = ''.join([
-                    pdb,
-                    '_',
-                    chain
-                ])
-                pdb_dict[outer_key] = {
-                    'sequence': '',
-                    'secstr': '',
-                    'disorder': ''}
-        # iterate through a second time and fill in
-        seqstr = ''
-        header_info = ss_data[0].split(':')
-        pdb = header_info[0][1:].upper()
-        chain = header_info[1]
-        ltype = header_info[2].rstrip()
-        len_ss_dis = len(ss_data)
-
-        for i in range(1, len_ss_dis):
-            line = ss_data[i]
-            if line[0] == '>':
-                outer_key = ''.join([
-                    pdb.upper(),
-                    '_',
-                    chain
-                ])
-                pdb_dict[outer_key][ltype] = seqstr
-                header_info = line.split(':')
-                pdb = header_info[0][1:].upper()
-                chain = header_info[1]
-                ltype = header_info[2].rstrip()
-                seqstr = ''
-            else:
-                seqstr += line.rstrip('\n')
-            if i == len_ss_dis - 1:
-                outer_key = ''.join([
-                    pdb,
-                    '_',
-                    chain
-                ])
-                pdb_dict[outer_key][ltype] = seqstr
-
+    for record in _iter_ss_records(ss_raw_data_filepath):
+        pdb_dict[record.pdb_chain] = {
+            'sequence': record.sequence,
+            'secstr': record.secstr,
+            'disorder': record.disorder
+        }
     return pdb_dict
 
 
 def _find_existing_files(ss_dir_path):
     """Find any and all ss_dis file in the specified path.
 
-    Both the json and text file are written with a timestamp to
+    Both the index and text file are written with a timestamp to
     assert that files belong to the same set of data. Find the
-    most current matching json/txt pair.
+    most current matching bin/txt pair.
 
     Args:
         ss_dir_path (Unicode): The directory path where ss_dis
@@ -417,15 +522,15 @@ def _find_existing_files(ss_dir_path):
 
                 valid_raw_file (Unicode): Path to the
                     validated ss_dis.txt file.
-                valid_json_file (Unicode): Path to the
-                    validated ss_dis.json file.
+                valid_bin_file (Unicode): Path to the
+                    validated ss_dis.bin file.
                 files_to_archive (list): A list of files
                     paths to be moved to the backup directory.
 
     """
     validation_results = {
         'valid_raw_file': None,
-        'valid_json_file': None,
+        'valid_bin_file': None,
         'files_to_archive': []
     }
     dis_file_paths = _find_ss_data(ss_dir_path)
@@ -433,17 +538,18 @@ def _find_existing_files(ss_dir_path):
     if not dis_file_paths:
         pass
 
-    # Use an existing raw data file, but archive if it's a json file.
+    # Use an existing raw data file, but archive an unpaired index
+    # or json file.
     elif len(dis_file_paths) == 1:
         this_file = dis_file_paths[0]
         this_extension = SS_DIS_PAT.search(this_file).group(3)
         if this_extension == 'txt':
             validation_results['valid_raw_file'] = this_file
         else:
-            assert this_extension == 'json'
+            assert this_extension in ('bin', 'json')
             validation_results['files_to_archive'].append(this_file)
 
-    # Find the most recent matching (raw/json) pair and archive the rest.
+    # Find the most recent matching (raw/bin) pair and archive the rest.
     elif len(dis_file_paths) > 1:
         assert len(dis_file_paths) > 1
         dis_file_names = [
@@ -459,25 +565,36 @@ def _find_existing_files(ss_dir_path):
             validation_results['files_to_archive'] = found['files_to_archive']
         if found['valid_raw_file']:
             validation_results['valid_raw_file'] = found['valid_raw_file']
-        if found['valid_json_file']:
-            validation_results['valid_json_file'] = found['valid_json_file']
+        if found['valid_bin_file']:
+            validation_results['valid_bin_file'] = found['valid_bin_file']
     else:
         raise SyntaxError("Unhandled case.")
 
     return validation_results
 
 
-def fetch_ss_dis(dir_path):
+def fetch_ss_dis(dir_path, lazy=False):
     """Return a processed dictionary for ss_dis data.
 
+    The result is cached while the index file is unchanged, and later
+    calls for the same directory return the same object. It is
+    read-only, so one caller can't change the data seen by another.
+
     Args:
         dir_path (Unicode): The dir path where ss_dis files are located.
+        lazy (bool): If true, return a SsDisMapping backed by the index
+            file instead of a SsDisView of the loaded dictionary. Chains
+            are then decoded only when they are accessed.
 
     Returns:
-        ss_dis_data (dict): A dictionary of processed ss_dis data.
+        ss_dis_data (SsDisView or SsDisMapping): Processed ss_dis data.
 
     """
     working_path = os.path.abspath(dir_path)
+    ss_dis_data = _cached_for_dir(working_path, lazy)
+    if ss_dis_data is not None:
+        return ss_dis_data
+
     ss_dis_files = _find_existing_files(working_path)
 
     if ss_dis_files['files_to_archive']:
@@ -494,53 +611,66 @@ def fetch_ss_dis(dir_path):
     else:
         valid_raw_fp = None
 
-    if ss_dis_files['valid_json_file']:
-        valid_json_fp = os.path.join(
-            working_path, ss_dis_files['valid_json_file']
+    if ss_dis_files['valid_bin_file']:
+        valid_bin_fp = os.path.join(
+            working_path, ss_dis_files['valid_bin_file']
         )
     else:
-        valid_json_fp = None
+        valid_bin_fp = None
 
-        # If we a valid pair exists, use the json to return a dictionary.
-    if valid_raw_fp and valid_json_fp:
+    # If a valid pair exists, use the index to return a dictionary.
+    if valid_raw_fp and valid_bin_fp:
         assert os.path.isfile(valid_raw_fp)
-        assert os.path.isfile(valid_json_fp)
-        current_json_path = valid_json_fp
+        assert os.path.isfile(valid_bin_fp)
+        current_bin_path = valid_bin_fp
 
-    # Generate a companion json file if a single raw file is found.
+    # Generate a companion index file if a single raw file is found.
     elif valid_raw_fp:
         valid_raw_fn = os.path.basename(valid_raw_fp)
-        assert not valid_json_fp
+        assert not valid_bin_fp
         this_timestamp = SS_DIS_PAT.search(valid_raw_fn).group(2)
-        companion_json = "{}.{}.{}".format(
+        companion_bin = "{}.{}.{}".format(
             'ss_dis',
             this_timestamp,
-            'json'
+            'bin'
         )
-        companion_json_path = os.path.join(working_path, companion_json)
-        ss_dict = _generate_ss_dict(valid_raw_fp)
-        write_json(ss_dict, companion_json_path)
-        current_json_path = companion_json_path
+        companion_bin_path = os.path.join(working_path, companion_bin)
+        _invalidate_ss_dis_cache(companion_bin_path)
+        write_ss_index(_iter_ss_records(valid_raw_fp), companion_bin_path)
+        current_bin_path = companion_bin_path
 
-    # Download new data and generate json file.
-    elif not (valid_raw_fp or valid_json_fp):
+    # Download new data and generate the index file.
+    elif not (valid_raw_fp or valid_bin_fp):
         new_names = _new_filenames()
         new_raw_path = os.path.join(working_path, new_names.raw)
-        new_json_path = os.path.join(working_path, new_names.json)
+        new_bin_path = os.path.join(working_path, new_names.bin)
 
         _download_ss_data(new_raw_path)
-        ss_dict = _generate_ss_dict(new_raw_path)
-        write_json(ss_dict, new_json_path)
-        current_json_path = new_json_path
+        _invalidate_ss_dis_cache(new_bin_path)
+        write_ss_index(_iter_ss_records(new_raw_path), new_bin_path)
+        current_bin_path = new_bin_path
 
-    elif valid_raw_fp and not valid_json_fp:
-        raise RuntimeError("Should not have a JSON file without a TXT file.")
+    elif valid_bin_fp and not valid_raw_fp:
+        raise RuntimeError("Should not have a BIN file without a TXT file.")
 
     else:
         raise RuntimeError("Unhandled case.")
 
-    # Always return the ss_dis dictionary by reading the json
+    # Always return the ss_dis dictionary by reading the index
     # file to ensure consistency of future runs.
-    ss_dis_data = read_json(current_json_path)
+    cache_key = _file_key(current_bin_path) + (lazy,)
+    ss_dis_data = _SS_DIS_CACHE.get(cache_key)
+    if ss_dis_data is None:
+        # Close data cached from an earlier version of the same file.
+        for stale_key in list(_SS_DIS_CACHE):
+            if stale_key[0] == cache_key[0] and stale_key[3] == lazy:
+                _close_ss_dis_data(_SS_DIS_CACHE.pop(stale_key))
+        if lazy:
+            ss_dis_data = SsDisMapping(current_bin_path)
+        else:
+            ss_dis_data = SsDisView(read_ss_index(current_bin_path))
+        _SS_DIS_CACHE[cache_key] = ss_dis_data
 
+    _SS_DIS_DIRS[(os.path.realpath(working_path), lazy)] = (
+        os.stat(working_path).st_mtime, cache_key[0])
     return ss_dis_data
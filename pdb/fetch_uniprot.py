@@ -4,42 +4,125 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
 import os
+import threading
 
-import pandas as pd
 import requests
-import time
 
 from logging import getLogger
-from io import open
+from multiprocessing.pool import ThreadPool
 
 
-from pdb.lib.create_delimiter import create_delimiter
 from pdb.lib.data_paths import ProjectFolders
+from pdb.lib.file_io import find_frame, read_frame, write_frame
 from pdb.lib.pdb_tools import read_pdb_chain_uniprot_uniIDs
 from pdb.lib.progress_bar import ProgressBar
+from pdb.lib.rate_limiter import TokenBucket
+from pdb.lib.uni_store import UniProtStore, import_fasta_folder
+
+
+UNI_URL = 'http://www.uniprot.org/uniprot/{}.fasta'
+UNI_BATCH_URL = (
+    'https://rest.uniprot.org/uniprotkb/accessions?accessions={}&format=fasta')
+
+
+def _split_fasta_records(lines):
+    """Split the lines of a multi-FASTA stream into records.
+
+    Args:
+        lines (iterable): The lines of a multi-FASTA response, with or
+            without line endings.
+
+    Yields:
+        (uni_id, fasta) (tuple): The accession from a UniProt header
+            (">sp|P00720|...") and the record text with "\n" line endings.
+
+    """
+    uni_id = None
+    record = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.startswith('>'):
+            if uni_id is not None:
+                yield uni_id, ''.join(record)
+            header = line[1:].split('|')
+            uni_id = header[1] if len(header) > 1 else header[0].split()[0]
+            record = []
+        if uni_id is not None and line:
+            record.append(''.join([line, '\n']))
+    if uni_id is not None:
+        yield uni_id, ''.join(record)
 
 
 class UniProtFetcher(object):
-    def __init__(self, dirs):
+    """Download FASTA files for the UniProt IDs in pdb_seq.
+
+    Downloads run on `workers` threads. Requests from all threads are
+    limited to `rate` per second on average by a shared token bucket.
+    If batch_size is set, IDs are requested batch_size at a time from
+    batch_url and the multi-FASTA response is split into records.
+    Records are written to the UniProtStore in dirs.uni_data, and
+    obsolete IDs are recorded there so they are not requested again.
+    The store's index is the manifest of what has been fetched: only
+    IDs that are not in it, or are older than max_age_days, are
+    downloaded.
+
+    Args:
+        dirs (ProjectFolders): A named tuple of directory paths.
+
+    Kwargs:
+        workers (int): The number of concurrent downloads.
+        rate (float): The maximum average number of requests per second.
+        uni_url (Unicode): The URL template for a UniProt FASTA file,
+            with {} in place of the UniProt ID.
+        batch_size (int): The number of IDs per batch request, or None
+            to request one ID at a time.
+        batch_url (Unicode): The URL template for a batch request, with
+            {} in place of the comma separated UniProt IDs.
+        max_age_days (float): Download stored IDs again if they were
+            fetched longer ago than this. None only downloads IDs that
+            are not in the store.
+
+    """
+    def __init__(self, dirs, workers=1, rate=2.5, uni_url=UNI_URL,
+                 batch_size=None, batch_url=UNI_BATCH_URL,
+                 max_age_days=None):
         assert isinstance(dirs, ProjectFolders)
+        if workers < 1:
+            raise ValueError("The number of workers must be at least 1.")
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("The batch size must be at least 1.")
         self.dirs = dirs
-
+        self.workers = workers
+        self.uni_url = uni_url
+        self.batch_size = batch_size
+        self.batch_url = batch_url
+        self.max_age_days = max_age_days
+        self.rate_limiter = TokenBucket(rate)
+
+        # Worker threads add IDs to these lists through _add_missing()
+        # and _add_obsolete(), which hold the lock.
         self.missing = []
         self.obs = []
+        self._lock = threading.Lock()
         self.pdb_seq_fp = None
         self.uni_list = None
         self.df = None
         self.uni_log = None
         self.session = None
+        self.uni_store = None
 
         self._initialize()
 
     def _initialize(self):
-        self.pdb_seq_fp = os.path.join(self.dirs.working, 'pdb_seq.tsv')
+        self.pdb_seq_fp = find_frame(self.dirs.working, 'pdb_seq')
+        if self.pdb_seq_fp is None:
+            raise IOError(
+                "No pdb_seq file in {}.".format(self.dirs.working))
         self._initialize_logs()
         self._initial_dataframe()
         self._initialize_uniprot_list()
         self._initialize_http_session()
+        self.uni_store = UniProtStore(self.dirs.uni_data)
         return None
 
     def _initialize_uniprot_list(self):
@@ -47,12 +130,7 @@ class UniProtFetcher(object):
         return None
 
     def _initial_dataframe(self):
-        self.df = pd.read_csv(
-            self.pdb_seq_fp,
-            sep='\t',
-            index_col=0,
-            keep_default_na=False,
-            na_values=['NULL', 'N/A'])
+        self.df = read_frame(self.pdb_seq_fp)
         return None
 
     def _initialize_logs(self):
@@ -60,39 +138,110 @@ class UniProtFetcher(object):
         return None
 
     def _initialize_http_session(self):
-        self.session = requests.Session()
-        self.session.mount(
-            "http://",
-            requests.adapters.HTTPAdapter(max_retries=3)
-        )
-        self.session.mount(
-            "https://",
-            requests.adapters.HTTPAdapter(max_retries=3)
-        )
+        # Sessions are not shared between threads; each worker thread
+        # gets its own from _thread_session().
+        self._local = threading.local()
+        self.session = self._thread_session()
         return None
 
+    def _thread_session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount(
+                "http://",
+                requests.adapters.HTTPAdapter(max_retries=3)
+            )
+            session.mount(
+                "https://",
+                requests.adapters.HTTPAdapter(max_retries=3)
+            )
+            self._local.session = session
+        return session
+
     def fetch_fasta_files(self):
         self._create_progress_bar()
 
-        for uni_id in self.uni_list:
-            fasta = None
-            fasta_fn = ''.join([uni_id, '.fasta'])
-            fasta_fp = os.path.join(self.dirs.uni_data, fasta_fn)
+        # Migrate a folder of per-ID FASTA files the first time.
+        if not self.uni_store.exists() and os.path.isdir(self.dirs.uni_data):
+            import_fasta_folder(self.dirs.uni_data, self.uni_store)
 
-            if os.path.exists(fasta_fp):
-                self._check_if_obsolete(fasta_fp, uni_id)
+        to_fetch = self.uni_store.ids_to_fetch(
+            self.uni_list, self.max_age_days)
+        to_download = []
+        for uni_id in self.uni_list:
+            if uni_id in to_fetch:
+                to_download.append(uni_id)
             else:
-                fasta = self._download_uniprot(uni_id)
-                time.sleep(.4)
+                if self.uni_store.is_obsolete(uni_id):
+                    self._add_obsolete(uni_id)
+                self.progress.inc()
+
+        group_size = self.batch_size or 1
+        groups = [
+            to_download[i:i + group_size]
+            for i in range(0, len(to_download), group_size)
+        ]
+
+        # Records are stored on this thread as results arrive.
+        if self.workers == 1 or len(groups) < 2:
+            results = (self._fetch_group(group) for group in groups)
+            self._store_downloads(results)
+        else:
+            pool = ThreadPool(min(self.workers, len(groups)))
+            try:
+                self._store_downloads(
+                    pool.imap_unordered(self._fetch_group, groups))
+            finally:
+                pool.close()
+                pool.join()
+
+        for uni_id in to_fetch.intersection(self.obs):
+            self.uni_store.put_obsolete(uni_id)
+        self._keep_stored_missing()
+        self.uni_store.save()
+        self.uni_store.close()
+        self._process_missing_and_obsolete()
+        self._write_new_dataframe()
+
+        return None
 
-            if fasta:
-                self._write_fasta(fasta, fasta_fp)
+    def _keep_stored_missing(self):
+        """Keep the stored records of IDs that failed to refresh."""
+        stored = [uni_id for uni_id in self.missing if uni_id in self.uni_store]
+        if stored:
+            self.uni_log.warning(
+                "Using the stored records of {} UniProt IDs that could "
+                "not be refreshed.".format(len(stored))
+            )
+            self.missing = [
+                uni_id for uni_id in self.missing
+                if uni_id not in self.uni_store
+            ]
+        return None
 
-            self.progress.inc()
+    def _add_missing(self, uni_ids):
+        with self._lock:
+            self.missing.extend(uni_ids)
+        return None
 
-        self._process_missing_and_obsolete()
-        self._write_new_dataframe()
+    def _add_obsolete(self, uni_id):
+        with self._lock:
+            self.obs.append(uni_id)
+        return None
 
+    def _fetch_group(self, uni_ids):
+        self.rate_limiter.acquire()
+        if self.batch_size:
+            return self._download_batch(uni_ids)
+        return [(uni_id, self._download_uniprot(uni_id)) for uni_id in uni_ids]
+
+    def _store_downloads(self, results):
+        for group_results in results:
+            for uni_id, fasta in group_results:
+                if fasta:
+                    self.uni_store.put(uni_id, fasta)
+                self.progress.inc()
         return None
 
     def _create_progress_bar(self):
@@ -107,12 +256,6 @@ class UniProtFetcher(object):
         )
         return None
 
-    def _check_if_obsolete(self, fasta_fp, uni_id):
-        with open(fasta_fp, 'r', encoding='utf-8') as existing_fh:
-            if len(existing_fh.read()) == 0:
-                self.obs.append(uni_id)
-        return None
-
     def _download_uniprot(self, uni_id):
         """Download a FASTA file from UniProt
 
@@ -120,10 +263,10 @@ class UniProtFetcher(object):
             uni_id (Unicode): A single UniProt ID.
 
         Returns:
-            result (dict): A dictionary with keys to indicate if a sequence
-                was returned, if the UniProt ID is obsolete, or
-                an error was encountered with the download as the
-                data is missing.
+            result (Unicode): The FASTA record, or None if the UniProt ID
+                is obsolete or an error was encountered with the
+                download. Obsolete IDs are added to self.obs and IDs
+                that could not be downloaded to self.missing.
 
         Raises:
             HTTPError: There is no file
@@ -132,81 +275,154 @@ class UniProtFetcher(object):
                 return an empty string.
 
         """
-        response = None
         result = None
-        uni_url = ("http://www.uniprot.org/uniprot/{}.fasta".format(uni_id))
+        response = self._request(self.uni_url.format(uni_id), [uni_id])
+        if response is not None:
+            if response.status_code == 200 and len(response.text) > 0:
+                result = response.text
+            elif response.status_code == 200 and len(response.text) == 0:
+                self._add_obsolete(uni_id)
+                self.uni_log.error(
+                    "[Obsolete] Zero-length record and HTTP 200 OK. "
+                    "{} added to list of obsolete IDs.".format(uni_id)
+                )
+            elif response.status_code == 404:
+                self._add_obsolete(uni_id)
+                self.uni_log.error(
+                    "[Obsolete] Server returned HTTP 404 Not Found. "
+                    "{} added to list of obsolete IDs.".format(uni_id)
+                )
+        return result
+
+    def _download_batch(self, uni_ids):
+        """Download the FASTA records of many UniProt IDs in one request.
+
+        The multi-FASTA response is split into records as it is
+        streamed. The batch endpoint returns secondary (merged)
+        accessions under their primary accession, and rejects the whole
+        request with a 4xx status if one accession is malformed, so IDs
+        without a record and the IDs of a rejected batch are requested
+        one at a time with _download_uniprot(), which follows redirects
+        and sorts out obsolete IDs. All of the IDs are missing if the
+        request fails otherwise.
+
+        Args:
+            uni_ids (list): UniProt IDs to request.
+
+        Returns:
+            results (list): (uni_id, fasta) pairs for the requested IDs,
+                where fasta is None for obsolete and missing IDs.
+
+        """
+        records = {}
+        response = self._request(
+            self.batch_url.format(','.join(uni_ids)), uni_ids, stream=True)
+        if response is None:
+            return [(uni_id, None) for uni_id in uni_ids]
+
+        if response.status_code == 200:
+            response.encoding = 'utf-8'
+            try:
+                records = dict(_split_fasta_records(
+                    response.iter_lines(decode_unicode=True)))
+            except requests.exceptions.RequestException:
+                self._add_missing(uni_ids)
+                self.uni_log.warning(
+                    "[Missing] Connection lost while reading a batch "
+                    "response. {} added to list of missing IDs.".format(
+                        ', '.join(uni_ids))
+                )
+                return [(uni_id, None) for uni_id in uni_ids]
+            finally:
+                response.close()
+        elif 400 <= response.status_code < 500:
+            response.close()
+            self.uni_log.warning(
+                "Server returned HTTP {} for a batch request. Requesting "
+                "{} one at a time.".format(
+                    response.status_code, ', '.join(uni_ids))
+            )
+        else:
+            response.close()
+            self._add_missing(uni_ids)
+            self.uni_log.error(
+                "[Missing] Server returned HTTP {} for a batch request. "
+                "{} added to list of missing IDs.".format(
+                    response.status_code, ', '.join(uni_ids))
+            )
+            return [(uni_id, None) for uni_id in uni_ids]
+
+        results = []
+        for uni_id in uni_ids:
+            fasta = records.get(uni_id)
+            if fasta is None:
+                self.rate_limiter.acquire()
+                fasta = self._download_uniprot(uni_id)
+            results.append((uni_id, fasta))
+        return results
+
+    def _request(self, url, uni_ids, stream=False):
+        """Return the response for a GET request, or None on failure.
+
+        If the request fails, uni_ids are added to self.missing and the
+        error is logged.
+
+        """
+        response = None
+        id_msg = ', '.join(uni_ids)
         try:
-            response = self.session.get(
-                url=uni_url,
-                timeout=5
+            response = self._thread_session().get(
+                url=url,
+                timeout=5,
+                stream=stream
             )
 
         except requests.exceptions.ConnectTimeout:
-            self.missing.append(uni_id)
+            self._add_missing(uni_ids)
             self.uni_log.critical(
                 "[Missing] Timed out while trying to connect to the server. "
                 "Could not download fasta file. "
-                "{} added to list of missing IDs.".format(uni_id)
+                "{} added to list of missing IDs.".format(id_msg)
             )
 
         except requests.exceptions.ConnectionError:
-            self.missing.append(uni_id)
+            self._add_missing(uni_ids)
             self.uni_log.critical(
                 "[Missing] Connection error attempting to "
                 "download fasta file. (DNS failure, refused "
                 "connection, etc.) "
-                "{} added to list of missing IDs.".format(uni_id)
+                "{} added to list of missing IDs.".format(id_msg)
             )
 
         except requests.exceptions.HTTPError:
-            self.missing.append(uni_id)
+            self._add_missing(uni_ids)
             self.uni_log.error(
                 "[Missing] Received an invalid HTTP response. "
-                "{} added to list of missing IDs.".format(uni_id)
+                "{} added to list of missing IDs.".format(id_msg)
             )
 
-        except requests.exceptions.TooManyRedirects:
-            self.missing.append(uni_id)
-            self.uni_log.warning(
-                "Redirect history was: {}".format(response.history)
-            )
+        except requests.exceptions.TooManyRedirects as redirect_err:
+            self._add_missing(uni_ids)
+            if redirect_err.response is not None:
+                self.uni_log.warning(
+                    "Redirect history was: {}".format(
+                        redirect_err.response.history)
+                )
             self.uni_log.warning(
                 "[Missing] Too many redirects while trying "
                 "to download fasta file. "
-                "{} added to list of missing IDs.".format(uni_id)
+                "{} added to list of missing IDs.".format(id_msg)
             )
 
         except requests.exceptions.ReadTimeout:
-            self.missing.append(uni_id)
+            self._add_missing(uni_ids)
             self.uni_log.warning(
                 "[Missing] Request timed out waiting for the server "
                 "while trying to download fasta file. "
-                "{} added to list of missing IDs.".format(uni_id)
+                "{} added to list of missing IDs.".format(id_msg)
             )
 
-        else:
-            if response.status_code == 200 and len(response.text) > 0:
-                result = response.text
-            elif response.status_code == 200 and len(response.text) == 0:
-                self.obs.append(uni_id)
-                self.uni_log.error(
-                    "[Obsolete] Zero-length record and HTTP 200 OK. "
-                    "{} added to list of obsolete IDs.".format(uni_id)
-                )
-            elif response.status_code == 404:
-                self.obs.append(uni_id)
-                self.uni_log.error(
-                    "[Obsolete] Server returned HTTP 404 Not Found. "
-                    "{} added to list of obsolete IDs.".format(uni_id)
-                )
-        return result
-
-    @staticmethod
-    def _write_fasta(response, fasta_fp):
-        if response:
-            with open(fasta_fp, 'w', encoding='utf-8') as new_fh:
-                new_fh.write(response)
-        return None
+        return response
 
     def _process_missing_and_obsolete(self):
         if self.missing:
@@ -248,6 +464,5 @@ class UniProtFetcher(object):
         return None
 
     def _write_new_dataframe(self):
-        delimiter = create_delimiter('\t')
-        self.df.to_csv(self.pdb_seq_fp, sep=delimiter, encoding='utf-8')
+        write_frame(self.df, self.pdb_seq_fp)
         return None
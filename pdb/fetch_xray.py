@@ -8,11 +8,11 @@ import os
 
 from ftplib import FTP
 from os.path import isfile, basename
-from pdb.lib.file_io import write_yaml
+from pdb.lib.file_io import write_id_set, write_yaml
 
 
-def fetch_xray(xray_fp, force_download=False):
-    """Fetch list of pdb entries, process, and write results to a yaml file.
+def fetch_xray(xray_fp, force_download=False, yaml_fp=None):
+    """Fetch list of pdb entries, process, and write results to an ID file.
 
     List of all PDB entries, identification of each as a protein,
     nucleic acid, or protein-nucleic acid complex and whether
@@ -22,9 +22,12 @@ def fetch_xray(xray_fp, force_download=False):
     http://www.rcsb.org/pdb/static.do?p=general_information/about_pdb/summaries.html
 
     Args:
-        xray_fp (Unicode): The destination yaml file to be written.
+        xray_fp (Unicode): The destination ID file to be written (see
+            pdb.lib.file_io.write_id_set).
         force_download (bool): If true, download the file even it
             the path already exists locally.
+        yaml_fp (Unicode): If given, also write the list to this yaml
+            file.
 
     Returns:
         None
@@ -65,6 +68,8 @@ def fetch_xray(xray_fp, force_download=False):
             if x_type == 'diffraction':
                 xray.append(pdb.upper())
 
-    write_yaml(xray, xray_fp)
+    write_id_set(xray, xray_fp)
     assert isfile(xray_fp)
+    if yaml_fp:
+        write_yaml(sorted(set(xray)), yaml_fp)
     return None
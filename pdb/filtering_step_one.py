@@ -10,15 +10,15 @@ from sys import version_info
 import pandas as pd
 
 from pdb.fetch_ss_dis import fetch_ss_dis
-from pdb.lib.create_delimiter import create_delimiter
-from pdb.lib.file_io import read_yaml
-from pdb.lib.pdb_tools import filter_single
-from pdb.lib.progress_bar import ProgressBar
+from pdb.lib.file_io import (
+    find_frame, frame_path, id_set_path, read_id_set, write_frame)
+from pdb.lib.pdb_tools import (
+    create_pdb_chain_keys, filter_single, read_pdb_chain_uniprot)
 
 PYTHON2 = version_info[0] == 2
 
 
-def initial_filtering(dirs):
+def initial_filtering(dirs, frame_format=None, chunksize=None):
     """Creates a dataframe from pdb_chain_uniprot.tsv.
 
     Perform initial filtering with pdb_chain_uniprot.tsv
@@ -37,8 +37,17 @@ def initial_filtering(dirs):
         10. Adds a column called 'PDB_SEQ' that has the section of the PDB
             chain corresponding to the interval in RES_BEG:RES_END.
 
+    The result is written to the working folder as pdb_seq, in the
+    format given by frame_format (see pdb.lib.file_io.frame_path).
+
     Args:
         dirs (ProjectFolders): A named tuple of directory paths.
+        frame_format (Unicode): The file format of pdb_seq. Defaults to
+            pdb.lib.file_io.DEFAULT_FRAME_FORMAT; use 'tsv' for a TSV
+            file.
+        chunksize (int): Read pdb_chain_uniprot.tsv this many rows at a
+            time, keeping only the rows that pass the row-by-row
+            filters. None reads the whole file at once.
 
     Returns:
         None
@@ -47,43 +56,38 @@ def initial_filtering(dirs):
     # Return used_local for unittest because of problems capturing stdout
     # with logging instance.
     used_local = False
-    pdb_seq_fp = os.path.join(dirs.working, 'pdb_seq.tsv')
+    pdb_seq_fp = find_frame(dirs.working, 'pdb_seq')
     msg = getLogger('root')
 
-    if not os.path.exists(pdb_seq_fp):
-        obs_fp = os.path.join(dirs.working, 'obs.yaml')
-        xray_fp = os.path.join(dirs.working, 'xray.yaml')
+    if pdb_seq_fp is None:
+        pdb_seq_fp = frame_path(dirs.working, 'pdb_seq', frame_format)
+        obs_fp = id_set_path(dirs.working, 'obs')
+        xray_fp = id_set_path(dirs.working, 'xray')
         chain_fp = os.path.join(dirs.tsv_data, 'pdb_chain_uniprot.tsv')
 
         msg.info('START: Initial filtering.')
 
         msg.debug("START: Fetch ss_dis.tsv.")
-        ss_dis = fetch_ss_dis(dirs.working)
+        ss_dis = fetch_ss_dis(dirs.working, lazy=True)
         msg.debug("COMPLETE: Fetch ss_dis.tsv.")
 
-        msg.debug("START: Read obs.yaml.")
-        obs = read_yaml(obs_fp)
-        msg.debug("COMPLETE: Read obs.yaml.")
+        msg.debug("START: Read {}.".format(basename(obs_fp)))
+        obs = read_id_set(obs_fp)
+        msg.debug("COMPLETE: Read {}.".format(basename(obs_fp)))
 
-        msg.debug("START: Read xray.yaml.")
-        xray = read_yaml(xray_fp)
-        msg.debug("COMPLETE: Read xray.yaml.")
+        msg.debug("START: Read {}.".format(basename(xray_fp)))
+        xray = read_id_set(xray_fp)
+        msg.debug("COMPLETE: Read {}.".format(basename(xray_fp)))
 
-        msg.debug("START: Create initial DataFrame.")
-        df = pd.read_csv(
-            chain_fp,
-            sep='\t',
-            header=1,
-            encoding='utf-8',
-            keep_default_na=False,
-            na_values=['NULL', 'N/A'])
-        msg.debug("COMPLETE: Create initial DataFrame.")
-        msg.debug("Initial DataFrame has {} rows.".format(len(df.index)))
-
-        msg.debug("START: Remove rows where "
+        msg.debug("START: Create initial DataFrame and remove rows where "
                   "the PDB ID is not in the xray list.")
-        df = filter_pdb_chain_uniprot(df, obs, xray)
-        msg.debug("COMPLETE: Remove rows where "
+        df = read_pdb_chain_uniprot(
+            chain_fp,
+            row_filter=lambda chunk: _filter_rows(chunk, obs, xray),
+            chunksize=chunksize
+        )
+        df = filter_single(df)
+        msg.debug("COMPLETE: Create initial DataFrame and remove rows where "
                   "the PDB ID is not in the xray list.")
         msg.debug("DataFrame now has {} rows.".format(len(df.index)))
 
@@ -99,10 +103,9 @@ def initial_filtering(dirs):
         msg.debug("COMPLETE: Remove UniProt IDs with < 2 pdb chains.")
         msg.debug("DataFrame now has {} rows.".format(len(df.index)))
 
-        msg.debug("START: Writing DataFrame to TSV file.")
-        delimiter = create_delimiter('\t')
-        df.to_csv(pdb_seq_fp, sep=delimiter, encoding='utf-8')
-        msg.debug("COMPLETE: Writing DataFrame to TSV file.")
+        msg.debug("START: Writing DataFrame to file.")
+        write_frame(df, pdb_seq_fp)
+        msg.debug("COMPLETE: Writing DataFrame to file.")
         msg.info(
             "Wrote {} to:\n\t{}".format(basename(pdb_seq_fp), pdb_seq_fp)
         )
@@ -125,7 +128,7 @@ def initial_filtering(dirs):
 def filter_pdb_chain_uniprot(df, obs, xray):
     """Step 1 filtering of the DataFrame from pdb_chain_uniprot.tsv.
 
-    Removes the PDB_BEG, PDB_END columns.
+    Removes the PDB_BEG, PDB_END columns, if they were read.
     Converts all PDB IDs to upper case.
     Removes any rows where the PDB ID isn't in the xray list.
     Removes any rows where the PDB ID is in the obs list.
@@ -135,22 +138,41 @@ def filter_pdb_chain_uniprot(df, obs, xray):
 
     Args:
         df (DataFrame): A pandas DataFrame read from pdb_chain_uniprot.tsv.
-        obs (list of Unicode): A list of PDB IDs that are obsolete entries.
-        xray (list of Unicode): A list of PDB IDs that are xray entries.
+        obs (frozenset of Unicode): PDB IDs that are obsolete entries.
+        xray (frozenset of Unicode): PDB IDs that are xray entries.
 
     Returns:
         A filtered DataFrame
 
     """
-    df.drop('PDB_BEG', axis=1, inplace=True)
-    df.drop('PDB_END', axis=1, inplace=True)
-    df.PDB = df.PDB.str.upper()
-    df = df[df.PDB.isin(xray)]
-    df = df[-df.PDB.isin(obs)]
+    df = _filter_rows(df, obs, xray)
+    df = filter_single(df)
+    return df
+
+
+def _filter_rows(df, obs, xray):
+    """Apply the filters of filter_pdb_chain_uniprot that use one row.
+
+    Everything except filter_single, so this can be applied to chunks
+    of the file.
+
+    """
+    unused = [name for name in ('PDB_BEG', 'PDB_END') if name in df.columns]
+    df = df.drop(unused, axis=1)
+    if isinstance(df.PDB.dtype, pd.CategoricalDtype):
+        df['PDB'] = df.PDB.str.upper().astype('category')
+    else:
+        df['PDB'] = df.PDB.str.upper()
+    # Check each distinct PDB ID against the sets once.
+    keep = [
+        pdb_id
+        for pdb_id in df.PDB.dropna().unique()
+        if pdb_id in xray and pdb_id not in obs
+    ]
+    df = df[df.PDB.isin(keep)]
     df = df[(df.RES_BEG > 0) & (df.SP_BEG > 0)]
     df = df[(df.RES_END-df.RES_BEG) == (df.SP_END-df.SP_BEG)]
     df = df[(df.RES_END-df.RES_BEG) > 3]
-    df = filter_single(df)
     return df
 
 
@@ -174,72 +196,39 @@ def add_pdbseq_to_df(df, ss_dis):
 
     Args:
         df (DataFrame): A pre-filtered DataFrame from pdb_chain_uniprot.tsv.
-        ss_dis (dictionary): A dictionary extracted from ss_dis.txt.
-        ss_dis has the following form:
+        ss_dis (dictionary): A dictionary extracted from ss_dis.txt,
+        or the equivalent SsDisMapping. ss_dis has the following form:
             ss_dis[pdb_A] = {
                 'sequence': '',
                 'secstr': '',
                 'disorder': ''
             }
     Returns:
-        A filtered DataFrame with an added column.
+        A filtered DataFrame with an added column. Rows whose PDB or
+        CHAIN can't form a PDB_CHAIN key are removed as well.
 
     """
-    log_pdb = getLogger('pdb_app_logger')
     log_root = getLogger('root')
-    df['PDB_SEQ'] = ''
-    progress = ProgressBar(
-        len(df.index),
-        start_msg="Removing rows for pdb_chains not in ss_dis.",
-        end_msg="Done removing rows for pdb_chains not in ss_dis.."
-    )
-    log_root.info("Adding PDB_SEQ can take quite a while.")
-    for i, row in df.iterrows():
-        try:
-            id_chain = ''.join([
-                row.PDB,
-                '_',
-                row.CHAIN
-            ])
-        except TypeError as append_err:
-            log_root.warning(
-                "Error appending row. Error was:\n"
-                "\t{}\n"
-                "\trow.PDB was: [{}] {}\n"
-                "\trow.CHAIN was: [{}]{}".format(
-                    append_err.args,
-                    type(row.PDB),
-                    row.PDB,
-                    type(row.CHAIN),
-                    row.CHAIN
-                )
-            )
-        if id_chain in ss_dis.keys():
-            peptide = ss_dis[id_chain]['sequence'][row.RES_BEG-1:row.RES_END]
-            df.set_value(i, 'PDB_SEQ', peptide)
-        else:
-            try:
-                df.drop(i, inplace=True)
-            except MemoryError as mem_err:
-                log_pdb.error(
-                    "Memory error while adding PDB peptide "
-                    "sequence to DataFrame:\n"
-                    "\t{}\n"
-                    "\t{}\n"
-                    "\t{}\n".format(
-                        mem_err.args[0],
-                        mem_err.args[1],
-                        mem_err.args[2]
-                    )
-                )
-                from struct import calcsize
-                int_struct_size = calcsize("P") * 8
-                if int_struct_size == 32:
-                    log_root.warning(
-                        "It appears you're on a 32-bit system and/or "
-                        "using a 32-bit version of Python. You may need "
-                        "to use a 64-bit version to avoid memory "
-                        "errors for these large calculations."
-                    )
-        progress.inc()
+    log_root.info("Adding PDB_SEQ for {} rows.".format(len(df.index)))
+    pdb_chains = create_pdb_chain_keys(df)
+
+    # Look up each distinct chain once, then filter with a single isin().
+    found = [
+        pdb_chain
+        for pdb_chain in pdb_chains.dropna().unique()
+        if pdb_chain in ss_dis
+    ]
+    in_ss_dis = pdb_chains.isin(found)
+    df = df[in_ss_dis].copy()
+    pdb_chains = pdb_chains[in_ss_dis]
+
+    # RES_BEG and RES_END are 1-based and inclusive.
+    df['PDB_SEQ'] = [
+        ss_dis[pdb_chain]['sequence'][res_beg - 1:res_end]
+        for pdb_chain, res_beg, res_end in zip(
+            pdb_chains.values,
+            df.RES_BEG.values,
+            df.RES_END.values
+        )
+    ]
     return df
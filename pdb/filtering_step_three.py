@@ -2,47 +2,56 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
-import os
-import pandas as pd
-
+from multiprocessing import Pool, cpu_count
 from os.path import basename
 
 from pdb.fetch_ss_dis import fetch_ss_dis
-from pdb.lib.create_delimiter import create_delimiter
 from pdb.lib.data_paths import ProjectFolders
+from pdb.lib.file_io import find_frame, frame_path, read_frame, write_frame
 from pdb.lib.pdb_tools import filter_single
 from pdb.pdb_composite import create_pdb_composite
 
 
-def final_filtering(dirs):
+def final_filtering(dirs, workers=None, frame_format=None):
     """Create PDB composite.
 
     Args:
         dirs (ProjectFolders): A named tuple of directory paths.
+        workers (int): The number of processes building PDB structures.
+            Defaults to the number of CPUs; 1 builds them in this
+            process.
+        frame_format (Unicode): The file format of
+            pdb_initial_composite_df. Defaults to
+            pdb.lib.file_io.DEFAULT_FRAME_FORMAT; use 'tsv' for a TSV
+            file.
 
     Returns:
         None
     """
-    pdb_initial_composite_fp = os.path.join(
-        dirs.tsv_data,
-        'pdb_initial_composite_df.tsv'
-    )
-
-    uni_filtered_path = os.path.join(
-        dirs.working,
-        'pdb_seq_uni_filtered.tsv'
-    )
-    if not os.path.exists(pdb_initial_composite_fp):
-        df = pd.read_csv(
-            uni_filtered_path,
-            sep='\t',
-            index_col=0,
-            keep_default_na=False,
-            na_values=['NULL', 'N/A']
-        )
-        ss_dis = fetch_ss_dis(dirs.working)
+    pdb_initial_composite_fp = find_frame(
+        dirs.tsv_data, 'pdb_initial_composite_df')
+    if pdb_initial_composite_fp is None:
+        pdb_initial_composite_fp = frame_path(
+            dirs.tsv_data, 'pdb_initial_composite_df', frame_format)
+        uni_filtered_path = find_frame(dirs.working, 'pdb_seq_uni_filtered')
+        if uni_filtered_path is None:
+            raise IOError(
+                "No pdb_seq_uni_filtered file in {}.".format(dirs.working))
+        df = read_frame(uni_filtered_path)
+        ss_dis = fetch_ss_dis(dirs.working, lazy=True)
         print("Creating PDB composite.")
-        df = create_pdb_composite(df, ss_dis, dirs.uni_data)
+        if workers is None:
+            workers = cpu_count()
+        if workers == 1:
+            df = create_pdb_composite(df, ss_dis, dirs.uni_data)
+        else:
+            pool = Pool(workers)
+            try:
+                df = create_pdb_composite(
+                    df, ss_dis, dirs.uni_data, executor=pool)
+            finally:
+                pool.close()
+                pool.join()
         print("\nPDB composite finished.")
 
         print(
@@ -55,8 +64,7 @@ def final_filtering(dirs):
         )
 
         print("Writing final PDB chain DataFrame.")
-        delimiter = create_delimiter('\t')
-        df.to_csv(pdb_initial_composite_fp, sep=delimiter, encoding='utf-8')
+        write_frame(df, pdb_initial_composite_fp)
         print(
             "Finished writing {}:\n"
             "\t{}\n"
@@ -2,19 +2,21 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
-import os
-import pandas as pd
+import numpy as np
 
-from Bio import SeqIO
-from io import open
 from logging import getLogger
+from multiprocessing import Pool, cpu_count
+from os.path import basename
+from zlib import crc32
 
-from pdb.lib.create_delimiter import create_delimiter
-from pdb.lib.data_paths import ProjectFolders, build_abs_path
+from pdb.lib.data_paths import ProjectFolders
+from pdb.lib.file_io import find_frame, frame_path, read_frame, write_frame
 from pdb.lib.progress_bar import ProgressBar
+from pdb.lib.uni_index import UniProtIndex
+from pdb.lib.uni_store import UniProtStore
 
 
-def second_filtering(dirs):
+def second_filtering(dirs, workers=None, frame_format=None):
     """Compare FASTA with PDB_SEQ and remove rows that aren't matches.
 
     Open a UniProt fasta file for each line and compare with PDB_SEQ.
@@ -23,6 +25,12 @@ def second_filtering(dirs):
 
     Args:
         dirs (ProjectFolders): A named tuple of directory paths.
+        workers (int): The number of processes comparing sequences.
+            Defaults to the number of CPUs.
+        frame_format (Unicode): The file format of
+            pdb_seq_uni_filtered. Defaults to
+            pdb.lib.file_io.DEFAULT_FRAME_FORMAT; use 'tsv' for a TSV
+            file.
 
     Returns:
         None
@@ -30,44 +38,37 @@ def second_filtering(dirs):
     """
     msg = getLogger('root')
     msg.info('START: Second filtering.')
-    uni_filtered_name = 'pdb_seq_uni_filtered.tsv'
-    uni_filtered_path = os.path.join(
-        dirs.working,
-        uni_filtered_name
-    )
-    delimiter = create_delimiter('\t')
-    if not os.path.exists(uni_filtered_path):
-        pdb_seq_path = os.path.join(dirs.working, 'pdb_seq.tsv')
-        df = pd.read_csv(
-            pdb_seq_path,
-            sep=delimiter,
-            index_col=0,
-            keep_default_na=False,
-            na_values=['NULL', 'N/A'])
+    uni_filtered_path = find_frame(dirs.working, 'pdb_seq_uni_filtered')
+    if uni_filtered_path is None:
+        uni_filtered_path = frame_path(
+            dirs.working, 'pdb_seq_uni_filtered', frame_format)
+        pdb_seq_path = find_frame(dirs.working, 'pdb_seq')
+        if pdb_seq_path is None:
+            raise IOError("No pdb_seq file in {}.".format(dirs.working))
+        df = read_frame(pdb_seq_path)
 
         print(
             "Comparing the PDB peptide to the corresponding "
             "section of the UniProt entry. "
             "Starting with {0} rows.".format(len(df.index))
         )
-        df = compare_to_uni(df, dirs.uni_data)
+        df = compare_to_uni(df, dirs.uni_data, workers)
         print(
             'Function "compare_to_uni" complete. '
             'There are now {} rows'.format(len(df.index))
         )
 
-        df.to_csv(uni_filtered_path, sep=delimiter, encoding='utf-8')
-        print("\npdb_seq_uni_filtered.tsv written")
+        write_frame(df, uni_filtered_path)
         print(
             "Wrote {} file; second "
-            "filtering complete.".format(uni_filtered_name)
+            "filtering complete.".format(basename(uni_filtered_path))
         )
         print('\t"{}"'.format(uni_filtered_path))
     else:
         print(
             "Found {}. Using local file:\n"
             "\t{}".format(
-                uni_filtered_name,
+                basename(uni_filtered_path),
                 uni_filtered_path
             )
         )
@@ -75,13 +76,20 @@ def second_filtering(dirs):
     return None
 
 
-def compare_to_uni(df, uni_folder):
+def compare_to_uni(df, uni_folder, workers=None):
     """Compare PDB seq to uniprot sequence; remove row if not exact match.
 
-    Opens a UniProt fasta file for each line and compares with PDB_SEQ.
+    The rows are split into shards by a hash of SP_PRIMARY, so all rows
+    of a UniProt ID are in the same shard. The UniProt index is read
+    once here and each shard is passed only the entries of its UniProt
+    IDs. Each shard is compared in its own process, which reads only
+    the sequences of its UniProt IDs, and the keep-masks of the shards
+    are merged back in row order. The rows that don't match are removed
+    in a single step.
 
     Removes rows if the PDB sequence section is not 100% match with
-    the corresponding UniProt section.
+    the corresponding UniProt section. Rows for obsolete UniProt IDs
+    are kept.
 
     Notes:
         Do this after UniProt files are downloaded.
@@ -90,35 +98,121 @@ def compare_to_uni(df, uni_folder):
 
     Args:
         df (DataFrame): A pre-filtered DataFrame from pdb_chain_uniprot.tsv
-        uni_folder (Unicode): A directory path to the folder that has single
-        UniProt fasta files.
+        uni_folder (Unicode): A directory path to the UniProt data
+            folder. Sequences are read from its UniProt store.
+        workers (int): The number of processes. Defaults to the number
+            of CPUs; 1 compares every row in this process.
 
     Returns:
-        A filtered DataFrame with PDB_SEQ removed, a list of UniProt
-        files that were missing from the UniProt folder.
+        A filtered DataFrame with PDB_SEQ removed.
     """
+    if workers is None:
+        workers = cpu_count()
+    if workers < 1:
+        raise ValueError("The number of workers must be at least 1.")
+
+    uni_ids = df.SP_PRIMARY.values
+    shards = _shard_rows(uni_ids, workers)
+    uni_index = UniProtIndex(uni_folder)
+    tasks = [
+        (
+            uni_folder,
+            uni_index.entries(set(uni_ids[positions])),
+            uni_ids[positions],
+            df.SP_BEG.values[positions],
+            df.SP_END.values[positions],
+            df.PDB_SEQ.values[positions]
+        )
+        for positions in shards
+    ]
     progress = ProgressBar(
-        len(df.index),
+        len(tasks),
         start_msg=("Comparing PDB uniprot sequences and "
                    "removing non-matching rows."),
         end_msg="Finished comparing PDB uniprot sequences.",
         approx_percentage=1
     )
-    for i, row in df.iterrows():
-        uni_id = row.SP_PRIMARY
-        uni_fp = build_abs_path(uni_folder, uni_id)
 
+    keep = np.ones(len(df.index), dtype=bool)
+    if workers == 1 or len(tasks) < 2:
+        for positions, task in zip(shards, tasks):
+            keep[positions] = _compare_shard(task)
+            progress.inc()
+    else:
+        pool = Pool(min(workers, len(tasks)))
+        try:
+            for positions, shard_keep in zip(
+                    shards, pool.imap(_compare_shard, tasks)):
+                keep[positions] = shard_keep
+                progress.inc()
+        finally:
+            pool.close()
+            pool.join()
+    df = df[keep]
+
+    df = df.drop('PDB_SEQ', axis=1)
+    return df
+
+
+def _shard_rows(uni_ids, shard_count):
+    """Split row positions into shards by a hash of the UniProt ID.
+
+    CRC-32 is used instead of hash() so the shards don't depend on the
+    interpreter's hash seed.
+
+    Args:
+        uni_ids (ndarray): The SP_PRIMARY value of every row.
+        shard_count (int): The maximum number of shards.
+
+    Returns:
+        shards (list): An ascending array of row positions for every
+            shard that has rows.
+
+    """
+    if len(uni_ids) == 0:
+        return []
+    distinct, inverse = np.unique(uni_ids, return_inverse=True)
+    distinct_shard = np.array([
+        (crc32(uni_id.encode('utf-8')) & 0xffffffff) % shard_count
+        for uni_id in distinct
+    ])
+    row_shard = distinct_shard[inverse]
+    shards = [
+        np.flatnonzero(row_shard == shard) for shard in range(shard_count)
+    ]
+    return [positions for positions in shards if len(positions)]
+
+
+def _compare_shard(task):
+    """Return the keep-mask for the rows of one shard.
+
+    Args:
+        task (tuple): The UniProt folder and the UniProt index entries
+            of the shard's UniProt IDs, followed by the SP_PRIMARY,
+            SP_BEG, SP_END and PDB_SEQ values of the shard's rows.
+
+    Returns:
+        keep (ndarray): True for rows whose PDB_SEQ matches their
+            UniProt section, or whose UniProt ID is obsolete or has no
+            sequence in the UniProt folder.
+
+    """
+    uni_folder, entries, uni_ids, sp_begs, sp_ends, pdb_seqs = task
+    uni_seqs = {}
+    uni_store = UniProtStore(uni_folder, entries)
+    for uni_id in set(uni_ids):
         try:
-            uni_seq = (SeqIO.read(open(uni_fp), "fasta")).seq
-        except ValueError:
+            uni_seqs[uni_id] = uni_store.get(uni_id)
+        except (KeyError, ValueError):
             print(
                 "The UniProt folder must have UniProt files for all "
                 "lines in the DataFrame. {0} cannot be opened".format(uni_id))
-        else:
-            uni_peptide = uni_seq[row.SP_BEG-1:row.SP_END]
-            if uni_peptide != row.PDB_SEQ:
-                df.drop(i, inplace=True)
-        progress.inc()
-
-    df.drop('PDB_SEQ', axis=1, inplace=True)
-    return df
+    uni_store.close()
+
+    keep = [
+        uni_id not in uni_seqs or
+        uni_seqs[uni_id][sp_beg - 1:sp_end] == pdb_seq
+        for uni_id, sp_beg, sp_end, pdb_seq in zip(
+            uni_ids, sp_begs, sp_ends, pdb_seqs)
+    ]
+    return np.array(keep, dtype=bool)
@@ -2,10 +2,14 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
-import re
+import numpy as np
 
 from pdb.lib.progress_bar import ProgressBar
 
+_X = ord('X')
+_LOWER_X = ord('x')
+_DASH = ord('-')
+
 
 def create_intervals(pdb_df, uni_df):
     """Add a column to uni_df with the missing interval regions.
@@ -16,6 +20,14 @@ def create_intervals(pdb_df, uni_df):
             ['conflict', (34, 45)]
         ]
 
+    The missing regions of every UniProt structure are found in one
+    pass with _missing_spans, which returns them by row position in
+    uni_df (find_missing_spans is the public form keyed by UniProt ID).
+    pdb_df is grouped by SP_PRIMARY once; the SEC_STRUCT values of each
+    group are viewed as a 2-D array of characters (one row per PDB
+    chain), and all missing regions of the group are classified at once
+    with classify_regions.
+
     Args:
         pdb_df (DataFrame): DataFrame with PDB_chains and composite structure.
         uni_df (DataFrame): DataFrame with UniProt IDs and
@@ -26,42 +38,63 @@ def create_intervals(pdb_df, uni_df):
             the missing interval regions.
 
     """
-    uni_df['MISSING'] = ''
     progress = ProgressBar(
         len(uni_df.index),
         approx_percentage=1,
         start_msg="Adding a column to uni_df with missing interval regions.",
         end_msg="Done adding columns."
     )
-    for i, row in uni_df.iterrows():
-        struct_indexes = []
-        uni_id = row.SP_PRIMARY
-        uni_struct = row.STRUCT
-        pdbs = pdb_df[pdb_df.SP_PRIMARY == uni_id]
-        indexes = _find_indexes(uni_struct)
-        for ind in indexes:
-            struct_intervals = []
-            for j, line in pdbs.iterrows():
-                assert len(line.SEC_STRUCT) == len(uni_struct)
-                struct_intervals.append(line.SEC_STRUCT[ind[0]:ind[1]])
-            for struct in struct_intervals:
-                assert len(struct) == len(struct_intervals[0])
-            assert len(struct_intervals) == len(pdbs.index)
-            dis_type = determine_dis_type(struct_intervals)
-            struct_indexes.append([dis_type, ind])
-        assert len(indexes) == len(struct_indexes)
-        uni_df.set_value(i, 'MISSING', struct_indexes)
+    group_positions = pdb_df.groupby('SP_PRIMARY', sort=False).indices
+    no_positions = np.array([], dtype=np.intp)
+    sec_structs = pdb_df.SEC_STRUCT.values
+    uni_structs = uni_df.STRUCT.values
+    span_rows, span_starts, span_ends = _missing_spans(uni_structs)
+    # Spans are in row order, so each row's spans are one slice.
+    bounds = np.searchsorted(span_rows, np.arange(len(uni_structs) + 1))
+    missing = np.empty(len(uni_df.index), dtype=object)
+    for i, (uni_id, uni_struct) in enumerate(
+            zip(uni_df.SP_PRIMARY.values, uni_structs)):
+        positions = group_positions.get(uni_id, no_positions)
+        structs = _struct_array(sec_structs[positions], len(uni_struct))
+        starts = span_starts[bounds[i]:bounds[i + 1]]
+        ends = span_ends[bounds[i]:bounds[i + 1]]
+        dis_types = classify_regions(structs, starts, ends)
+        missing[i] = [
+            [dis_type, (start, end)]
+            for dis_type, start, end in zip(
+                dis_types.tolist(), starts.tolist(), ends.tolist())
+        ]
         progress.inc()
+    uni_df['MISSING'] = missing
     return uni_df
 
 
+def _struct_array(sec_structs, struct_len):
+    """Return structure strings as a 2-D uint8 array, one row per string.
+
+    Args:
+        sec_structs (iterable): Structure strings of length struct_len.
+        struct_len (int): The length of the UniProt structure.
+
+    Returns:
+        structs (ndarray): An array of shape (len(sec_structs),
+            struct_len) with the character codes of each string.
+
+    """
+    for sec_struct in sec_structs:
+        assert len(sec_struct) == struct_len
+    joined = ''.join(sec_structs).encode('ascii')
+    structs = np.frombuffer(joined, dtype=np.uint8)
+    return structs.reshape(len(sec_structs), struct_len)
+
+
 def _find_indexes(uni_struct):
     """ Returns the index positions of the missing regions.
 
     Given a string of characters, returns a list of indexes that provide
-    the coordinates for contiguous stretches of 'X'. It will provide
-    the initial index (starting from 0), and the last index +1, so
-    these can be used to directly  call the missing region.
+    the coordinates for contiguous stretches of 'X' (of either case). It
+    will provide the initial index (starting from 0), and the last
+    index +1, so these can be used to directly  call the missing region.
 
     Args:
     uni_struct (string): of the form '---OOOXXX--O'
@@ -70,14 +103,128 @@ def _find_indexes(uni_struct):
         A list of indexes.. For example: [(0,10), (50,73),...]
 
     """
-    return (
-        [
-            pos.span()
-            for pos in re.finditer(r'(x+)', uni_struct, re.IGNORECASE)
-        ]
+    _, starts, ends = _missing_spans([uni_struct])
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def find_missing_spans(uni_ids, uni_structs):
+    """Return the missing regions of many UniProt structures.
+
+    Args:
+        uni_ids (list): The UniProt ID of each structure.
+        uni_structs (list): UniProt composite structures of the form
+            '---OOOXXX--O'.
+
+    Returns:
+        span_ids (ndarray): The UniProt ID of every missing region.
+        starts (ndarray): The first index of every missing region.
+        ends (ndarray): The last index + 1 of every missing region.
+        The regions are in the order of uni_structs, and then by start.
+
+    """
+    rows, starts, ends = _missing_spans(uni_structs)
+    span_ids = np.asarray(uni_ids, dtype=object)[rows]
+    return span_ids, starts, ends
+
+
+def _missing_spans(uni_structs):
+    """Find the runs of 'X' or 'x' in many structures at once.
+
+    The structures are joined into one byte array with a separator after
+    each, so every run ends inside its own structure. Runs start where
+    the difference of the padded 'X' mask is 1 and end where it is -1.
+
+    Args:
+        uni_structs (list): ASCII structure strings.
+
+    Returns:
+        rows (ndarray): The position in uni_structs of every run.
+        starts (ndarray): The first index of every run in its structure.
+        ends (ndarray): The last index + 1 of every run.
+
+    """
+    sizes = np.array([len(uni_struct) + 1 for uni_struct in uni_structs],
+                     dtype=np.intp)
+    offsets = np.cumsum(sizes) - sizes
+    joined = ''.join([uni_struct + '.' for uni_struct in uni_structs])
+    codes = np.frombuffer(joined.encode('ascii'), dtype=np.uint8)
+    is_x = np.zeros(len(codes) + 1, dtype=np.int8)
+    is_x[1:] = (codes == _X) | (codes == _LOWER_X)
+    edges = np.diff(is_x)
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    rows = np.searchsorted(offsets, run_starts, side='right') - 1
+    return rows, run_starts - offsets[rows], run_ends - offsets[rows]
+
+
+def classify_regions(structs, starts=None, ends=None):
+    """Determine the disorder types of regions of a structure array.
+
+    For every region, the 'X' and '-' characters of each row are
+    counted with cumulative sums over the array, and the disorder type
+    is decided from those counts:
+        conflict: At least one row has neither 'X' nor '-'.
+        discarded: Fewer than two rows have an 'X'.
+        conserved: Every row is all 'X'.
+        contained: At least one row is all 'X'.
+        overlap: Anything else.
+
+    Args:
+        structs (ndarray): A 2-D uint8 array of character codes with one
+            row per PDB chain and one column per residue.
+        starts (list): The first column of each region. Defaults to a
+            single region covering every column.
+        ends (list): The last column + 1 of each region.
+
+    Returns:
+        dis_types (ndarray): The disorder type of every region.
+
+    """
+    if starts is None:
+        starts, ends = [0], [structs.shape[1]]
+    starts = np.asarray(starts, dtype=np.intp)
+    ends = np.asarray(ends, dtype=np.intp)
+    x_counts = _region_counts(structs == _X, starts, ends)
+    dash_counts = _region_counts(structs == _DASH, starts, ends)
+    widths = ends - starts
+
+    has_x = x_counts > 0
+    all_x = (x_counts == widths) & (widths > 0)
+    conflict = ((x_counts == 0) & (dash_counts == 0)).any(axis=0)
+    qualifies = has_x.sum(axis=0) >= 2
+    return np.select(
+        [conflict, ~qualifies, all_x.all(axis=0), all_x.any(axis=0)],
+        ['conflict', 'discarded', 'conserved', 'contained'],
+        default='overlap'
     )
 
 
+def _region_counts(matches, starts, ends):
+    """Return the number of matches in each row of every region.
+
+    Args:
+        matches (ndarray): A 2-D boolean array.
+        starts (ndarray): The first column of each region.
+        ends (ndarray): The last column + 1 of each region.
+
+    Returns:
+        counts (ndarray): An array of shape (rows, regions).
+
+    """
+    cumulative = np.zeros(
+        (matches.shape[0], matches.shape[1] + 1), dtype=np.intp)
+    np.cumsum(matches, axis=1, out=cumulative[:, 1:])
+    return cumulative[:, ends] - cumulative[:, starts]
+
+
+def _interval_counts(struct_intervals):
+    """Return per-interval 'X' counts, '-' counts and lengths."""
+    x_counts = np.array([si.count('X') for si in struct_intervals])
+    dash_counts = np.array([si.count('-') for si in struct_intervals])
+    lengths = np.array([len(si) for si in struct_intervals])
+    return x_counts, dash_counts, lengths
+
+
 def determine_dis_type(struct_intervals):
     """Determine disorder type.
 
@@ -86,53 +233,37 @@ def determine_dis_type(struct_intervals):
         ['XXP', 'XXP', 'XPP', 'XPP', 'XPP', 'XXX', '-XP', '-PP', 'XPP',
         'XXP', 'XXP', 'XPP']
 
+    The strings must have the same length. See classify_regions for the
+    rules.
+
     """
-    if _is_conflict(struct_intervals):
-        return 'conflict'
-    elif not _qualifies(struct_intervals):
-        return 'discarded'
-    elif _is_conserved(struct_intervals):
-        return 'conserved'
-    elif _is_contained(struct_intervals):
-        return 'contained'
-    else:
-        return 'overlap'
+    width = len(struct_intervals[0]) if len(struct_intervals) else 0
+    structs = _struct_array(struct_intervals, width)
+    return classify_regions(structs).tolist()[0]
 
 
 def _qualifies(struct_intervals, num=2):
     # At least num entries with X.
-    count = 0
-    for si in struct_intervals:
-        if 'X' in si:
-            count += 1
-    if count >= num:
-        return True
-    else:
-        return False
+    x_counts, _, _ = _interval_counts(struct_intervals)
+    return bool((x_counts > 0).sum() >= num)
 
 
 def _is_conflict(struct_intervals):
     # Contains any combination of: P, E, G, T, S, H, B, I.
     # Does not contain 'X' or '-'.
     # Only needs one interval to have structure.
-    for si in struct_intervals:
-        if 'X' not in si and '-' not in si:
-            return True
-    return False
+    x_counts, dash_counts, _ = _interval_counts(struct_intervals)
+    return bool(((x_counts == 0) & (dash_counts == 0)).any())
 
 
 def _is_conserved(struct_intervals):
-    for si in struct_intervals:
-        if set(si) != {'X'}:
-            return False
-    return True
+    x_counts, _, lengths = _interval_counts(struct_intervals)
+    return bool(((x_counts == lengths) & (lengths > 0)).all())
 
 
 def _is_contained(struct_intervals):
     # At least one is set(si) == set(['X']) and at least one other has at
     #  least one X. This tests only for the presence of
     #  one full length disordered interval.
-    for si in struct_intervals:
-        if set(si) == {'X'}:
-            return True
-    return False
+    x_counts, _, lengths = _interval_counts(struct_intervals)
+    return bool(((x_counts == lengths) & (lengths > 0)).any())
@@ -7,12 +7,16 @@ import json
 import os
 import yaml
 
+import pandas as pd
+
+from collections import OrderedDict
 from filecmp import cmp
 from logging import getLogger
 from os.path import isfile
 from shutil import copy2
 from sys import version_info
 
+from pdb.lib.create_delimiter import create_delimiter
 from pdb.lib.datetime_info import now_utc
 
 PYTHON2 = version_info[0] == 2
@@ -23,6 +27,34 @@ if PYTHON2:
 else:
     from io import open
 
+try:
+    import pyarrow  # Feather and Parquet backends.
+except ImportError:
+    pyarrow = None
+
+# Use the libyaml bindings when PyYAML was built with them. The safe
+# loader and dumper only handle plain data (no python/* tags).
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
+# DataFrame formats for the files passed between pipeline stages, in the
+# order find_frame() looks for them.
+FRAME_EXTENSIONS = OrderedDict([
+    ('feather', '.feather'),
+    ('parquet', '.parquet'),
+    ('pickle', '.pkl'),
+    ('tsv', '.tsv')
+])
+DEFAULT_FRAME_FORMAT = 'feather' if pyarrow is not None else 'pickle'
+
+# Feather files can't store an index, so it is kept in this column.
+_FEATHER_INDEX = '__index__'
+
+# Sets of PDB IDs are stored as sorted text files with one ID per line.
+ID_SET_EXTENSION = '.ids'
+
 
 def write_json(data, dst_path):
     """Write object as JSON to the destination path."""
@@ -56,7 +88,7 @@ def read_yaml(yaml_file):
 
     """
     with open(yaml_file, 'r', encoding='utf-8') as yaml_fh:
-        ss_dict = yaml.load(yaml_fh)
+        ss_dict = yaml.load(yaml_fh, Loader=YamlLoader)
     return ss_dict
 
 
@@ -108,6 +140,7 @@ def write_yaml(data, yaml_path, **yaml_params):
         yaml.dump(
             data,
             fh,
+            Dumper=YamlDumper,
             **default_params
         )
     assert os.path.isfile(yaml_path)
@@ -116,6 +149,166 @@ def write_yaml(data, yaml_path, **yaml_params):
     return None
 
 
+def id_set_path(dir_path, name):
+    """Return the path of an ID set file, e.g. 'xray' or 'obs'.
+
+    This is the <name>.ids file, unless only a YAML file from an earlier
+    version exists, in which case that is returned.
+
+    """
+    ids_fp = os.path.join(dir_path, ''.join([name, ID_SET_EXTENSION]))
+    yaml_fp = os.path.join(dir_path, ''.join([name, '.yaml']))
+    if not isfile(ids_fp) and isfile(yaml_fp):
+        return yaml_fp
+    return ids_fp
+
+
+def write_id_set(ids, dst_path):
+    """Write a set of IDs as sorted lines of text.
+
+    Paths ending in .yaml are written as a YAML list instead.
+
+    Args:
+        ids (iterable): The IDs. Duplicates are written once.
+        dst_path (Unicode): The path of the file to be written.
+
+    Returns:
+        None
+
+    """
+    ids = sorted(set(ids))
+    if dst_path.endswith('.yaml'):
+        write_yaml(ids, dst_path)
+        return None
+    with open(dst_path, 'w', encoding='utf-8') as ids_fh:
+        ids_fh.write(''.join(['{}\n'.format(an_id) for an_id in ids]))
+    assert isfile(dst_path)
+    return None
+
+
+def read_id_set(src_path):
+    """Return the IDs in a file written by write_id_set as a frozenset.
+
+    YAML lists from earlier versions are read as well.
+
+    """
+    if src_path.endswith('.yaml'):
+        return frozenset(read_yaml(src_path) or [])
+    with open(src_path, 'r', encoding='utf-8') as ids_fh:
+        return frozenset(ids_fh.read().split())
+
+
+def frame_path(dir_path, name, frame_format=None):
+    """Return the path of a stage DataFrame file.
+
+    Args:
+        dir_path (Unicode): The directory of the file.
+        name (Unicode): The file name without an extension,
+            e.g. 'pdb_seq'.
+        frame_format (Unicode): One of FRAME_EXTENSIONS. Defaults to
+            DEFAULT_FRAME_FORMAT.
+
+    Returns:
+        The file path, with the extension of the format.
+
+    """
+    if frame_format is None:
+        frame_format = DEFAULT_FRAME_FORMAT
+    if frame_format not in FRAME_EXTENSIONS:
+        raise ValueError(
+            "Unknown DataFrame format: {}".format(frame_format))
+    if frame_format in ('feather', 'parquet') and pyarrow is None:
+        raise ValueError(
+            "The {} format requires pyarrow.".format(frame_format))
+    return os.path.join(
+        dir_path, ''.join([name, FRAME_EXTENSIONS[frame_format]]))
+
+
+def find_frame(dir_path, name):
+    """Return the path of an existing stage DataFrame file, or None.
+
+    Every format in FRAME_EXTENSIONS is checked, so files written by
+    earlier versions as TSV are still found.
+
+    """
+    for extension in FRAME_EXTENSIONS.values():
+        path = os.path.join(dir_path, ''.join([name, extension]))
+        if isfile(path):
+            return path
+    return None
+
+
+def _frame_format(path):
+    for frame_format, extension in FRAME_EXTENSIONS.items():
+        if path.endswith(extension):
+            return frame_format
+    raise ValueError("Unknown DataFrame file type: {}".format(path))
+
+
+def write_frame(df, dst_path):
+    """Write a DataFrame in the format given by the path's extension.
+
+    Args:
+        df (DataFrame): The DataFrame, including its index.
+        dst_path (Unicode): A path from frame_path().
+
+    Returns:
+        None
+
+    """
+    msg = getLogger('root')
+    msg.info("START: Writing DataFrame: {}".format(dst_path))
+    frame_format = _frame_format(dst_path)
+    if frame_format == 'feather':
+        df.rename_axis(_FEATHER_INDEX).reset_index().to_feather(dst_path)
+    elif frame_format == 'parquet':
+        df.to_parquet(dst_path, engine='pyarrow')
+    elif frame_format == 'pickle':
+        df.to_pickle(dst_path)
+    else:
+        delimiter = create_delimiter('\t')
+        df.to_csv(dst_path, sep=delimiter, encoding='utf-8')
+    assert isfile(dst_path)
+    msg.info("COMPLETE: Finished writing DataFrame: {}".format(dst_path))
+    return None
+
+
+def read_frame(src_path):
+    """Read a DataFrame written by write_frame.
+
+    TSV files are read with the first column as the index and only
+    'NULL' and 'N/A' as missing values.
+
+    Args:
+        src_path (Unicode): The path of the file.
+
+    Returns:
+        The DataFrame.
+
+    """
+    msg = getLogger('root')
+    msg.info("START: Reading DataFrame: {}".format(src_path))
+    frame_format = _frame_format(src_path)
+    if frame_format == 'feather':
+        df = pd.read_feather(src_path).set_index(_FEATHER_INDEX)
+        df.index.name = None
+    elif frame_format == 'parquet':
+        df = pd.read_parquet(src_path, engine='pyarrow')
+    elif frame_format == 'pickle':
+        df = pd.read_pickle(src_path)
+    else:
+        df = pd.read_csv(
+            src_path,
+            sep=create_delimiter('\t'),
+            index_col=0,
+            encoding='utf-8',
+            keep_default_na=False,
+            na_values=['NULL', 'N/A']
+        )
+    msg.info("COMPLETE: Finished reading DataFrame: {}".format(src_path))
+    return df
+
+
 def backup_file(original_file_path):
     log_pdb = getLogger('pdb_app_logger')
 
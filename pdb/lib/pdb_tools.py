@@ -3,8 +3,86 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
 from logging import getLogger
+from sys import version_info
 
-from pdb.lib.progress_bar import ProgressBar
+import pandas as pd
+
+PYTHON2 = version_info[0] == 2
+
+if PYTHON2:
+    STRING_TYPES = (str, unicode)
+else:
+    STRING_TYPES = (str,)
+
+# The pdb_chain_uniprot.tsv columns that are loaded. PDB_BEG and PDB_END
+# are author residue numbers (which can include insertion codes) and
+# aren't used.
+PDB_CHAIN_UNIPROT_ID_COLUMNS = ['PDB', 'CHAIN', 'SP_PRIMARY']
+PDB_CHAIN_UNIPROT_INTERVAL_COLUMNS = ['RES_BEG', 'RES_END', 'SP_BEG', 'SP_END']
+
+
+def read_pdb_chain_uniprot(chain_fp, row_filter=None, chunksize=None):
+    """Return a typed DataFrame from pdb_chain_uniprot.tsv.
+
+    Only the ID and interval columns are read. The intervals are read
+    as int32, and the ID columns, whose values repeat heavily, are
+    converted to categoricals. The memory use is logged before and
+    after the conversion.
+
+    With a chunksize, the file is read that many rows at a time and
+    only the rows kept by row_filter are held in memory, so row_filter
+    must only use the values within each row.
+
+    Args:
+        chain_fp (Unicode): The path of pdb_chain_uniprot.tsv.
+        row_filter (function): Takes a DataFrame and returns the rows
+            to keep. Applied to each chunk, or to the whole file.
+        chunksize (int): The number of rows per chunk. None reads the
+            file at once.
+
+    Returns:
+        df (DataFrame): The PDB, CHAIN, SP_PRIMARY, RES_BEG, RES_END,
+            SP_BEG and SP_END columns, in file order.
+
+    """
+    msg = getLogger('root')
+    dtypes = {column: object for column in PDB_CHAIN_UNIPROT_ID_COLUMNS}
+    dtypes.update({
+        column: 'int32' for column in PDB_CHAIN_UNIPROT_INTERVAL_COLUMNS
+    })
+    reader = pd.read_csv(
+        chain_fp,
+        sep='\t',
+        header=1,
+        encoding='utf-8',
+        usecols=list(dtypes),
+        dtype=dtypes,
+        keep_default_na=False,
+        na_values=['NULL', 'N/A'],
+        chunksize=chunksize)
+    if chunksize is None:
+        reader = [reader]
+
+    chunks = []
+    row_count = 0
+    for chunk in reader:
+        row_count += len(chunk.index)
+        if row_filter is not None:
+            chunk = row_filter(chunk)
+        chunks.append(chunk)
+    df = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+    msg.info("Read {} rows from {}, kept {}: {:.1f} MB.".format(
+        row_count, chain_fp, len(df.index), _memory_mb(df)))
+
+    for column in PDB_CHAIN_UNIPROT_ID_COLUMNS:
+        df[column] = df[column].astype('category')
+    msg.info("Converted ID columns to categoricals: {:.1f} MB.".format(
+        _memory_mb(df)))
+    return df
+
+
+def _memory_mb(df):
+    return df.memory_usage(index=True, deep=True).sum() / 2 ** 20
 
 
 def filter_single(df):
@@ -15,10 +93,11 @@ def filter_single(df):
     separate.
 
     Note that it is possible to have the same protein multiple times
-    on a single chain, and that's why I have chosen to actually iterate
-    through and check for unique chains for those tsv files that have the
-    PDB and CHAIN separated. Note also that a unique key is created by
-    pdb id, chain and uniprot ID.
+    on a single chain, and that's why unique chains are counted rather
+    than rows. The rows are grouped by UniProt ID once and the unique
+    PDB_CHAIN keys are counted per group. For a DataFrame with PDB and
+    CHAIN separated, the key is built first; rows where it can't be
+    built are logged and don't count towards a UniProt ID.
 
     Args:
         df: This can accept a DataFrame that has the PDB_CHAIN combined,
@@ -28,64 +107,66 @@ def filter_single(df):
         A filtered DataFrame
 
     """
-    log_error = getLogger('pdb_app_logger')
+    msg = getLogger('root')
+    msg.info("Removing UniProt IDs with only one unique PDB chain.")
     if 'PDB_CHAIN' in df.columns:
-        uni_list = read_pdb_chain_uniprot_uniIDs(df)
-        drop_list = []
-        progress = ProgressBar(
-            len(uni_list),
-            start_msg="Removing UniProt IDs with only one unique PDB chain.",
-            end_msg="Done removing UniProt IDs."
-        )
-        for uni in uni_list:
-            pdbs = df[df.SP_PRIMARY == uni]
-            if len(pdbs.index) < 2:
-                drop_list.append(uni)
-            progress.inc()
-        df = df[-df.SP_PRIMARY.isin(drop_list)]
-
+        pdb_chains = df.PDB_CHAIN
     else:
-        uni_list = read_pdb_chain_uniprot_uniIDs(df)
-        drop_list = []
-        progress = ProgressBar(
-            len(uni_list),
-            start_msg="Removing UniProt IDs with only one unique PDB chain.",
-            end_msg="Done removing UniProt IDs."
-        )
-        for uni in uni_list:
-            pdbs = df[df.SP_PRIMARY == uni]
-            pdb_chains = []
-            for i, row in pdbs.iterrows():
-                try:
-                    new_chain = ''.join([
-                        row.PDB,
-                        '_',
-                        row.CHAIN
-                    ])
-                except TypeError as append_err:
-                    log_error.warning(
-                        "Error appending row. Error was:\n"
-                        "\t{}\n"
-                        "\trow.PDB was: [{}] {}\n"
-                        "\trow.CHAIN was: [{}]{}".format(
-                            append_err.args,
-                            type(row.PDB),
-                            row.PDB,
-                            type(row.CHAIN),
-                            row.CHAIN
-                        )
-                    )
-                else:
-                    pdb_chains.append(new_chain)
-
-            if len(set(pdb_chains)) < 2:
-                drop_list.append(uni)
-            progress.inc()
-        df = df[-df.SP_PRIMARY.isin(drop_list)]
+        pdb_chains = create_pdb_chain_keys(df)
 
+    chain_counts = pdb_chains.groupby(df.SP_PRIMARY.values).nunique()
+    keep_list = chain_counts.index[chain_counts > 1]
+    df = df[df.SP_PRIMARY.isin(keep_list)]
+    msg.info("Done removing UniProt IDs.")
     return df
 
 
+def create_pdb_chain_keys(df):
+    """Return a Series of PDB_CHAIN keys built from the PDB and CHAIN columns.
+
+    The keys are built in one vectorized operation. Rows where PDB or
+    CHAIN is not a string (for example NaN) can't form a key; they are
+    logged together and get None as their key.
+
+    Args:
+        df (DataFrame): A DataFrame with PDB and CHAIN columns.
+
+    Returns:
+        pdb_chains (Series): The PDB_CHAIN keys, aligned with df.index.
+
+    """
+    log_error = getLogger('pdb_app_logger')
+    # Categorical columns can't be concatenated as strings.
+    pdbs = df.PDB.astype(object)
+    chains = df.CHAIN.astype(object)
+    is_str = pdbs.map(_is_string) & chains.map(_is_string)
+    pdb_chains = pd.Series(None, index=df.index, dtype=object)
+    pdb_chains[is_str] = pdbs[is_str] + '_' + chains[is_str]
+
+    if not is_str.all():
+        bad_rows = df.loc[~is_str, ['PDB', 'CHAIN']]
+        err_msg = "Unable to create a PDB_CHAIN key for {} rows:".format(
+            len(bad_rows.index))
+        for i, row in bad_rows.iterrows():
+            err_msg = (
+                "{}\n"
+                "\trow {}: PDB was: [{}] {}, CHAIN was: [{}] {}".format(
+                    err_msg,
+                    i,
+                    type(row.PDB),
+                    row.PDB,
+                    type(row.CHAIN),
+                    row.CHAIN
+                )
+            )
+        log_error.warning(err_msg)
+    return pdb_chains
+
+
+def _is_string(value):
+    return isinstance(value, STRING_TYPES)
+
+
 def read_pdb_chain_uniprot_uniIDs(df):
     """Extract UniIDs from a pdb_chain_uniprot.tsv DataFrame."""
     uni_list = df.SP_PRIMARY.tolist()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""A thread-safe token bucket for rate limiting requests."""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """Allow on average `rate` acquisitions per second.
+
+    The bucket holds up to `capacity` tokens and is refilled continuously
+    at `rate` tokens per second. acquire() takes one token, blocking until
+    one is available, so short bursts of up to `capacity` requests are
+    allowed while the long-run rate never exceeds `rate`. A single bucket
+    can be shared by any number of threads.
+
+    Example:
+        bucket = TokenBucket(rate=2.5)
+        for uni_id in uni_list:
+            bucket.acquire()
+            download(uni_id)
+
+    """
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("The rate must be greater than 0.")
+        if capacity < 1:
+            raise ValueError("The capacity must be at least 1.")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        elapsed = max(now - self._last, 0)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last = now
+        return None
+
+    def acquire(self):
+        """Take one token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return None
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
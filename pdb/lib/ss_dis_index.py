@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""Read and write the binary ss_dis index.
+
+The index is a single file that stores the processed ss_dis data for
+every PDB chain. It is laid out as follows:
+
+    header:  magic, version, number of chains, key width and the
+             byte offset of the index table.
+    data:    the UTF-8 sequence, secstr and disorder strings of every
+             chain, concatenated without separators.
+    index:   a table sorted by PDB_CHAIN with the offset and length of
+             each of the three strings in the data section.
+
+The file is opened with mmap and the index table is viewed in place
+with NumPy, so a lookup is a binary search over the table followed by
+a slice of the mapped file. Nothing is read until a chain is requested.
+SsDisMapping wraps the index in the dictionary interface used by the
+filtering stages, and SsDisView is a read-only view of a fully loaded
+ss_dis dictionary.
+
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from collections import OrderedDict
+from io import open
+from logging import getLogger
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # Python 2
+
+SS_INDEX_MAGIC = b'SSDISIDX'
+SS_INDEX_VERSION = 1
+
+# Magic, version, chain count, key width, index offset.
+_HEADER = struct.Struct(str('<8sIIIQ'))
+
+_FIELDS = ('sequence', 'secstr', 'disorder')
+
+
+def _index_dtype(key_width):
+    """Return the NumPy dtype of one row in the index table.
+
+    Field names are passed through str() because NumPy on Python 2
+    does not accept Unicode field names, which is what every literal
+    is under unicode_literals.
+
+    """
+    return np.dtype([
+        (str('key'), str('S{}'.format(key_width))),
+        (str('sequence_offset'), str('<u8')),
+        (str('sequence_length'), str('<u4')),
+        (str('secstr_offset'), str('<u8')),
+        (str('secstr_length'), str('<u4')),
+        (str('disorder_offset'), str('<u8')),
+        (str('disorder_length'), str('<u4'))
+    ])
+
+
+def write_ss_index(records, dst_path):
+    """Write ss_dis records to a binary index file.
+
+    The strings are streamed to the data section as the records are
+    consumed, so records can be a generator and only the (small) index
+    table is held in memory. The file is written to a temporary path
+    and renamed when complete, so a partial file is never left at
+    dst_path.
+
+    Args:
+        records (iterable): 4-tuples of the form
+            (pdb_chain, sequence, secstr, disorder).
+        dst_path (Unicode): The path of the index file to be written.
+
+    Returns:
+        None
+
+    """
+    msg = getLogger('root')
+    msg.info("START: Writing ss_dis index: {}".format(dst_path))
+    tmp_path = ''.join([dst_path, '.tmp'])
+    entries = {}
+    with open(tmp_path, 'wb') as index_fh:
+        index_fh.write(
+            _HEADER.pack(SS_INDEX_MAGIC, SS_INDEX_VERSION, 0, 0, 0))
+        offset = _HEADER.size
+        for pdb_chain, sequence, secstr, disorder in records:
+            entry = []
+            for value in (sequence, secstr, disorder):
+                encoded = value.encode('utf-8')
+                index_fh.write(encoded)
+                entry.extend([offset, len(encoded)])
+                offset += len(encoded)
+            # Later records replace earlier ones, as with a dictionary.
+            entries[pdb_chain.encode('utf-8')] = entry
+
+        keys = sorted(entries)
+        key_width = max([len(key) for key in keys] or [1])
+        table = np.zeros(len(keys), dtype=_index_dtype(key_width))
+        table['key'] = keys
+        for i, name in enumerate(_FIELDS):
+            table['{}_offset'.format(name)] = [
+                entries[key][2 * i] for key in keys]
+            table['{}_length'.format(name)] = [
+                entries[key][2 * i + 1] for key in keys]
+        index_fh.write(table.tobytes())
+
+        index_fh.seek(0)
+        index_fh.write(_HEADER.pack(
+            SS_INDEX_MAGIC, SS_INDEX_VERSION, len(keys), key_width, offset))
+
+    if os.path.exists(dst_path):
+        os.remove(dst_path)
+    os.rename(tmp_path, dst_path)
+    assert os.path.isfile(dst_path)
+    msg.info("COMPLETE: Finished writing ss_dis index: {}".format(dst_path))
+    return None
+
+
+class SsDisIndex(object):
+    """A read-only, memory-mapped view of a binary ss_dis index.
+
+    Example:
+        ss_index = SsDisIndex(index_path)
+        sequence, secstr, disorder = ss_index.record('101M_A')
+        ss_index.close()
+
+    """
+    def __init__(self, src_path):
+        self.path = os.path.abspath(src_path)
+        self._fh = open(self.path, 'rb')
+        try:
+            self._mm = mmap.mmap(
+                self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fh.close()
+            raise RuntimeError(
+                "Unable to map ss_dis index: {}".format(self.path))
+
+        magic, version, count, key_width, index_offset = _HEADER.unpack(
+            self._mm[:_HEADER.size])
+        if magic != SS_INDEX_MAGIC or version != SS_INDEX_VERSION:
+            self.close()
+            raise RuntimeError(
+                "Not a valid ss_dis index file: {}".format(self.path))
+
+        self._table = np.frombuffer(
+            self._mm,
+            dtype=_index_dtype(key_width),
+            count=count,
+            offset=index_offset
+        )
+        self._keys = self._table['key']
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for key in self._keys:
+            yield key.decode('utf-8')
+
+    def __contains__(self, pdb_chain):
+        return self._position(pdb_chain) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _position(self, pdb_chain):
+        """Return the row of pdb_chain in the index table, or None."""
+        try:
+            key = pdb_chain.encode('utf-8')
+        except AttributeError:
+            return None
+        position = int(np.searchsorted(self._keys, key))
+        if position < len(self._keys) and self._keys[position] == key:
+            return position
+        return None
+
+    def _decode_row(self, row):
+        """Return the decoded key and strings of one index table row."""
+        key, seq_off, seq_len, ss_off, ss_len, dis_off, dis_len = row
+        return (
+            key.decode('utf-8'),
+            self._mm[seq_off:seq_off + seq_len].decode('utf-8'),
+            self._mm[ss_off:ss_off + ss_len].decode('utf-8'),
+            self._mm[dis_off:dis_off + dis_len].decode('utf-8')
+        )
+
+    def record(self, pdb_chain):
+        """Return (sequence, secstr, disorder) for a PDB chain.
+
+        Raises:
+            KeyError: The PDB chain is not in the index.
+
+        """
+        position = self._position(pdb_chain)
+        if position is None:
+            raise KeyError(pdb_chain)
+        return self._decode_row(self._table[position].tolist())[1:]
+
+    def iter_records(self):
+        """Yield (pdb_chain, sequence, secstr, disorder) in key order.
+
+        Reads the table sequentially instead of searching it for every
+        key, which is the fast path for loading the whole index.
+
+        """
+        for row in self._table.tolist():
+            yield self._decode_row(row)
+
+    def close(self):
+        """Release the table view, the memory map and the file handle."""
+        self._table = None
+        self._keys = None
+        if not self._mm.closed:
+            self._mm.close()
+        self._fh.close()
+        return None
+
+
+class SsDisMapping(Mapping):
+    """A read-only ss_dis dictionary backed by a binary index.
+
+    Behaves like the dictionary returned by read_ss_index, but a chain's
+    strings are decoded only when the chain is accessed. The most
+    recently used entries are kept in an LRU cache of cache_size chains.
+
+    Example:
+        ss_dis = SsDisMapping(index_path)
+        if '101M_A' in ss_dis:
+            sequence = ss_dis['101M_A']['sequence']
+
+    """
+    def __init__(self, src_path, cache_size=1024):
+        if cache_size < 1:
+            raise ValueError("The cache size must be at least 1.")
+        self._index = SsDisIndex(src_path)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self.path = self._index.path
+
+    def __getitem__(self, pdb_chain):
+        try:
+            entry = self._cache.pop(pdb_chain)
+        except KeyError:
+            sequence, secstr, disorder = self._index.record(pdb_chain)
+            entry = {
+                'sequence': sequence,
+                'secstr': secstr,
+                'disorder': disorder
+            }
+            if len(self._cache) >= self._cache_size:
+                self._cache.popitem(last=False)
+        self._cache[pdb_chain] = entry
+        return entry
+
+    def __contains__(self, pdb_chain):
+        return pdb_chain in self._cache or pdb_chain in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """Clear the cache and close the underlying index."""
+        self._cache.clear()
+        self._index.close()
+        return None
+
+
+class SsDisView(Mapping):
+    """A read-only view of an ss_dis dictionary.
+
+    The chain entries are returned as read-only views as well, so the
+    same loaded dictionary can be shared without being copied.
+
+    Example:
+        ss_dis = SsDisView(read_ss_index(index_path))
+        sequence = ss_dis['101M_A']['sequence']
+
+    """
+    def __init__(self, ss_dis):
+        self._data = ss_dis
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if isinstance(value, dict):
+            return SsDisView(value)
+        return value
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return 'SsDisView({!r})'.format(self._data)
+
+
+def read_ss_index(src_path):
+    """Return the full ss_dis dictionary stored in a binary index.
+
+    Args:
+        src_path (Unicode): The path of the index file.
+
+    Returns:
+        ss_dis (dict): A dictionary in the following form:
+            ss_dis[pdb_chain] = {
+                'sequence': '',
+                'secstr': '',
+                'disorder': ''
+            }
+
+    """
+    msg = getLogger('root')
+    msg.info("START: Reading ss_dis index: {}".format(src_path))
+    ss_dis = {}
+    with SsDisIndex(src_path) as ss_index:
+        for pdb_chain, sequence, secstr, disorder in ss_index.iter_records():
+            ss_dis[pdb_chain] = {
+                'sequence': sequence,
+                'secstr': secstr,
+                'disorder': disorder
+            }
+    msg.info("COMPLETE: Finished reading ss_dis index: {}".format(src_path))
+    return ss_dis
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Read and write the UniProt sequence index.
+
+The index is a tab separated file in the UniProt data folder with one
+line per UniProt ID:
+
+    uni_id    offset    size    length    fetched    checksum
+
+where offset and size locate the ID's record in the UniProt store in
+bytes (see pdb.lib.uni_store), length is the number of residues in the
+sequence, fetched is the time the record was downloaded (seconds since
+the epoch) and checksum is the MD5 digest of the sequence. Obsolete IDs
+are recorded with an offset of -1 so that they are not downloaded again.
+
+Sequence lengths can be looked up without reading any FASTA data, and
+the index is the manifest for incremental updates: ids_to_fetch()
+returns the IDs that are new or older than a given age.
+
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import time
+
+from collections import namedtuple
+from io import open
+from logging import getLogger
+
+UNI_INDEX_NAME = 'uniprot_index.tsv'
+
+Uni_Entry = namedtuple(
+    'uni_index_entry', ['offset', 'size', 'length', 'fetched', 'checksum'])
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def read_uni_index(uni_folder):
+    """Return the entries of the index file in a UniProt folder.
+
+    Args:
+        uni_folder (Unicode): The UniProt data folder.
+
+    Returns:
+        entries (dict): Uni_Entry values keyed by UniProt ID. Empty if
+            the folder has no index file.
+
+    """
+    entries = {}
+    index_fp = os.path.join(uni_folder, UNI_INDEX_NAME)
+    if os.path.isfile(index_fp):
+        with open(index_fp, 'r', encoding='utf-8') as index_fh:
+            for line in index_fh:
+                fields = line.rstrip('\n').split('\t')
+                # Indexes without fetch times are treated as fetched at
+                # the epoch, so they are refreshed by any max age.
+                if len(fields) == 4:
+                    fields.extend(['0', ''])
+                uni_id, offset, size, length, fetched, checksum = fields
+                entries[uni_id] = Uni_Entry(
+                    offset=int(offset),
+                    size=int(size),
+                    length=int(length),
+                    fetched=int(fetched),
+                    checksum=checksum
+                )
+    return entries
+
+
+def write_uni_index(entries, uni_folder):
+    """Write index entries to the index file in a UniProt folder.
+
+    The file is written to a temporary path and then renamed.
+
+    Args:
+        entries (dict): Uni_Entry values keyed by UniProt ID.
+        uni_folder (Unicode): The UniProt data folder.
+
+    Returns:
+        None
+
+    """
+    index_fp = os.path.join(uni_folder, UNI_INDEX_NAME)
+    tmp_fp = ''.join([index_fp, '.tmp'])
+    with open(tmp_fp, 'w', encoding='utf-8') as index_fh:
+        for uni_id in sorted(entries):
+            entry = entries[uni_id]
+            index_fh.write('{}\t{}\t{}\t{}\t{}\t{}\n'.format(
+                uni_id,
+                entry.offset,
+                entry.size,
+                entry.length,
+                entry.fetched,
+                entry.checksum
+            ))
+    if os.path.exists(index_fp):
+        os.remove(index_fp)
+    os.rename(tmp_fp, index_fp)
+    assert os.path.isfile(index_fp)
+    return None
+
+
+class UniProtIndex(object):
+    """The index entries of the UniProt IDs in a UniProt folder.
+
+    Entries are loaded from the index file unless they are passed in,
+    so a parent process can load the index once and hand each worker
+    only the entries it needs. Call save() to persist changes.
+
+    Example:
+        uni_index = UniProtIndex(dirs.uni_data)
+        uni_seq_len = uni_index.length('P00720')
+        to_fetch = uni_index.ids_to_fetch(uni_list, max_age_days=30)
+
+    """
+    def __init__(self, uni_folder, entries=None):
+        self.folder = uni_folder
+        if entries is None:
+            entries = read_uni_index(uni_folder)
+        self._entries = dict(entries)
+        self._changed = False
+
+    def __contains__(self, uni_id):
+        entry = self._entries.get(uni_id)
+        return entry is not None and entry.offset != -1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def exists(self):
+        """Return True if the index file has been written to the folder."""
+        return os.path.isfile(os.path.join(self.folder, UNI_INDEX_NAME))
+
+    def is_obsolete(self, uni_id):
+        """Return True if the UniProt ID is recorded as obsolete."""
+        entry = self._entries.get(uni_id)
+        return entry is not None and entry.offset == -1
+
+    def entries(self, uni_ids):
+        """Return the entries of the indexed IDs among uni_ids.
+
+        Args:
+            uni_ids (iterable): UniProt IDs.
+
+        Returns:
+            entries (dict): Uni_Entry values keyed by UniProt ID. IDs
+                that are not in the index are left out.
+
+        """
+        return {
+            uni_id: self._entries[uni_id]
+            for uni_id in uni_ids
+            if uni_id in self._entries
+        }
+
+    def ids_to_fetch(self, uni_ids, max_age_days=None):
+        """Return the UniProt IDs that need to be downloaded.
+
+        Args:
+            uni_ids (iterable): The UniProt IDs that are needed.
+            max_age_days (float): Also return IDs, including obsolete
+                ones, that were fetched longer ago than this. None never
+                refreshes indexed IDs.
+
+        Returns:
+            to_fetch (set): IDs that are not in the index, plus any that
+                are older than max_age_days.
+
+        """
+        uni_ids = set(uni_ids)
+        to_fetch = uni_ids.difference(self._entries)
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * SECONDS_PER_DAY
+            to_fetch.update(
+                uni_id
+                for uni_id in uni_ids.intersection(self._entries)
+                if self._entries[uni_id].fetched < cutoff
+            )
+        return to_fetch
+
+    def length(self, uni_id):
+        """Return the length of the sequence of a UniProt ID.
+
+        Raises:
+            KeyError: The UniProt ID is not in the index.
+            ValueError: The UniProt ID is obsolete.
+
+        """
+        entry = self._entries[uni_id]
+        if entry.offset == -1:
+            raise ValueError("{} is obsolete.".format(uni_id))
+        return entry.length
+
+    def save(self):
+        """Write the index file if it changed or doesn't exist yet."""
+        if self._changed or not self.exists():
+            write_uni_index(self._entries, self.folder)
+            getLogger('root').info(
+                "Wrote UniProt index with {} entries: {}".format(
+                    len(self._entries), self.folder))
+            self._changed = False
+        return None
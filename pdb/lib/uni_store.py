@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""A single-file store for UniProt FASTA records.
+
+All UniProt records are kept in one multi-FASTA file in the UniProt data
+folder. The UniProt index (see pdb.lib.uni_index) in the same folder
+locates each record in the file and records obsolete IDs, and
+UniProtStore extends UniProtIndex with reading and writing the records.
+
+Records are only ever appended; replacing a record with a different
+sequence appends the new one and points the index at it.
+
+Folders that still hold one <uni_id>.fasta file per ID can be migrated
+with import_fasta_folder(). Until they are, lookups for IDs that are not
+in the store fall back to those files.
+
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import hashlib
+import os
+import time
+
+from io import open
+from logging import getLogger
+
+from pdb.lib.data_paths import build_abs_path
+from pdb.lib.uni_index import UniProtIndex, Uni_Entry
+
+UNI_STORE_NAME = 'uniprot.fasta'
+
+
+def _checksum(sequence):
+    return hashlib.md5(sequence.encode('ascii')).hexdigest()
+
+
+def _parse_sequence(fasta):
+    """Return the sequence of a single FASTA record.
+
+    Args:
+        fasta (bytes): The record, starting with its header line.
+
+    Raises:
+        ValueError: The record is empty (an obsolete entry) or is not
+            in FASTA format.
+
+    """
+    if not fasta.startswith(b'>'):
+        raise ValueError("No FASTA record found.")
+    lines = fasta.decode('utf-8').splitlines()
+    return ''.join(line.strip() for line in lines[1:])
+
+
+class UniProtStore(UniProtIndex):
+    """UniProt sequences stored in a single indexed multi-FASTA file.
+
+    As with UniProtIndex, entries can be passed in instead of being
+    read from the index file.
+
+    Example:
+        uni_store = UniProtStore(dirs.uni_data)
+        if 'P00720' in uni_store:
+            uni_seq = uni_store.get('P00720')
+            uni_seq_len = uni_store.length('P00720')
+        uni_store.close()
+
+    """
+    def __init__(self, uni_folder, entries=None):
+        UniProtIndex.__init__(self, uni_folder, entries)
+        self.path = os.path.join(uni_folder, UNI_STORE_NAME)
+        self._legacy = {}
+        self._read_fh = None
+        self._append_fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def get(self, uni_id):
+        """Return the sequence of a UniProt ID.
+
+        Raises:
+            KeyError: The UniProt ID is not in the store or the folder.
+            ValueError: The UniProt ID is obsolete.
+
+        """
+        entry = self._entries.get(uni_id)
+        if entry is None:
+            return self._legacy_sequence(uni_id)
+        if entry.offset == -1:
+            raise ValueError("{} is obsolete.".format(uni_id))
+        sequence = _parse_sequence(self._read(entry))
+        assert len(sequence) == entry.length
+        return sequence
+
+    def length(self, uni_id):
+        """Return the length of the sequence of a UniProt ID.
+
+        Raises:
+            KeyError: The UniProt ID is not in the store or the folder.
+            ValueError: The UniProt ID is obsolete.
+
+        """
+        entry = self._entries.get(uni_id)
+        if entry is None:
+            return len(self._legacy_sequence(uni_id))
+        return UniProtIndex.length(self, uni_id)
+
+    def put(self, uni_id, fasta, fetched=None):
+        """Add the FASTA record of a UniProt ID to the store.
+
+        The record is appended unless the stored sequence is identical,
+        in which case only the fetch time is updated.
+
+        Args:
+            uni_id (Unicode): The UniProt ID.
+            fasta (Unicode): A single FASTA record.
+            fetched (int): When the record was downloaded, in seconds
+                since the epoch. Defaults to now.
+
+        Raises:
+            ValueError: The record is not in FASTA format.
+
+        """
+        if fetched is None:
+            fetched = int(time.time())
+        record = fasta.encode('utf-8')
+        if not record.endswith(b'\n'):
+            record += b'\n'
+        sequence = _parse_sequence(record)
+        checksum = _checksum(sequence)
+
+        entry = self._entries.get(uni_id)
+        if entry is not None and entry.checksum == checksum:
+            self._entries[uni_id] = entry._replace(fetched=fetched)
+        else:
+            if self._append_fh is None:
+                self._append_fh = open(self.path, 'ab')
+                self._append_fh.seek(0, os.SEEK_END)
+            offset = self._append_fh.tell()
+            self._append_fh.write(record)
+            self._entries[uni_id] = Uni_Entry(
+                offset=offset,
+                size=len(record),
+                length=len(sequence),
+                fetched=fetched,
+                checksum=checksum
+            )
+        self._changed = True
+        return None
+
+    def put_obsolete(self, uni_id, fetched=None):
+        """Record a UniProt ID as obsolete."""
+        if fetched is None:
+            fetched = int(time.time())
+        self._entries[uni_id] = Uni_Entry(
+            offset=-1, size=0, length=0, fetched=fetched, checksum='')
+        self._changed = True
+        return None
+
+    def save(self):
+        """Flush appended records and write the index if it changed."""
+        if self._append_fh is not None:
+            self._append_fh.flush()
+        UniProtIndex.save(self)
+        return None
+
+    def close(self):
+        """Close the store's file handles. Unsaved changes are lost."""
+        for fh in (self._read_fh, self._append_fh):
+            if fh is not None:
+                fh.close()
+        self._read_fh = None
+        self._append_fh = None
+        return None
+
+    def _read(self, entry):
+        if self._append_fh is not None:
+            self._append_fh.flush()
+        if self._read_fh is None:
+            self._read_fh = open(self.path, 'rb')
+        self._read_fh.seek(entry.offset)
+        return self._read_fh.read(entry.size)
+
+    def _legacy_sequence(self, uni_id):
+        """Return the sequence from a per-ID FASTA file in the folder."""
+        try:
+            return self._legacy[uni_id]
+        except KeyError:
+            pass
+        fasta_fp = build_abs_path(self.folder, uni_id)
+        if not os.path.isfile(fasta_fp):
+            raise KeyError(uni_id)
+        with open(fasta_fp, 'rb') as fasta_fh:
+            sequence = _parse_sequence(fasta_fh.read())
+        self._legacy[uni_id] = sequence
+        return sequence
+
+
+def import_fasta_folder(uni_folder, uni_store=None):
+    """Import the per-ID FASTA files of a UniProt folder into its store.
+
+    Files for IDs that are already in the store are skipped. Empty files
+    are recorded as obsolete IDs. The modification time of a file is
+    used as its fetch time. The files themselves are left in place.
+
+    Args:
+        uni_folder (Unicode): The UniProt data folder.
+        uni_store (UniProtStore): An open store for the folder. A new
+            one is opened and closed if this is None.
+
+    Returns:
+        imported (int): The number of files imported.
+
+    """
+    msg = getLogger('root')
+    own_store = uni_store is None
+    if own_store:
+        uni_store = UniProtStore(uni_folder)
+    imported = 0
+    for file_name in sorted(os.listdir(uni_folder)):
+        uni_id, extension = os.path.splitext(file_name)
+        if extension != '.fasta' or file_name == UNI_STORE_NAME:
+            continue
+        if uni_id in uni_store or uni_store.is_obsolete(uni_id):
+            continue
+        fasta_fp = os.path.join(uni_folder, file_name)
+        fetched = int(os.path.getmtime(fasta_fp))
+        with open(fasta_fp, 'rb') as fasta_fh:
+            fasta = fasta_fh.read()
+        if len(fasta) == 0:
+            uni_store.put_obsolete(uni_id, fetched)
+        else:
+            uni_store.put(uni_id, fasta.decode('utf-8'), fetched)
+        imported += 1
+    uni_store.save()
+    if own_store:
+        uni_store.close()
+    msg.info("Imported {} FASTA files into the UniProt store: {}".format(
+        imported, uni_folder))
+    return imported
@@ -2,11 +2,14 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import numpy as np
 import pandas as pd
 
-from pdb.lib.pdb_tools import read_pdb_chain_uniprot_uniIDs
 from pdb.lib.progress_bar import ProgressBar
 
+# Byte values of the composite structure designations.
+_STRUCT_CODES = {code: ord(code) for code in ('X', '-', 'O')}
+
 
 def create_uni_struct(pdb_df):
     """ Creates a DataFrame that has UniProt ID and composite
@@ -21,25 +24,16 @@ def create_uni_struct(pdb_df):
 
     """
     uni_struct = {'SP_PRIMARY': [], 'STRUCT': []}
-    uni_list = read_pdb_chain_uniprot_uniIDs(pdb_df)
+    _validate_uni_groups(pdb_df)
+    grouped = pdb_df.groupby('SP_PRIMARY', sort=False).SEC_STRUCT
     progress = ProgressBar(
-        len(uni_list),
+        grouped.ngroups,
         approx_percentage=1,
         start_msg="Creating DataFrame with ID and composite structure.",
         end_msg="Done creating DataFrame with ID and composite structure."
     )
-    for uni in uni_list:
-        pdbs = pdb_df[pdb_df.SP_PRIMARY == uni]
-        struct_list = []
-        assert len(pdbs.index) > 1
-        for i, row in pdbs.iterrows():
-            struct_list.append(row.SEC_STRUCT)
-        assert len(struct_list) > 1
-        for struct in struct_list:
-            assert len(struct) > 0
-            assert len(struct) == len(struct_list[0])
-        assert len(struct_list) == len(pdbs.index)
-        comp_struct = _uni_struct(struct_list)
+    for uni, structs in grouped:
+        comp_struct = _uni_struct(structs.tolist())
         uni_struct['SP_PRIMARY'].append(uni)
         uni_struct['STRUCT'].append(comp_struct)
         progress.inc()
@@ -48,14 +42,47 @@ def create_uni_struct(pdb_df):
     return df
 
 
+def _validate_uni_groups(pdb_df):
+    """Check the structures of every UniProt ID in one pass.
+
+    Every UniProt ID must have more than one structure, and all of its
+    structures must be non-empty and of equal length.
+
+    Raises:
+        AssertionError: Lists the UniProt IDs that failed a check.
+
+    """
+    lengths = pdb_df.SEC_STRUCT.str.len()
+    by_uni = lengths.groupby(pdb_df.SP_PRIMARY.values)
+    group_stats = pd.DataFrame({
+        'count': by_uni.size(),
+        'min_len': by_uni.min(),
+        'n_lens': by_uni.nunique()
+    })
+    single = group_stats.index[group_stats['count'] < 2].tolist()
+    assert not single, (
+        "UniProt IDs with only one structure: {}".format(single))
+    empty = group_stats.index[group_stats.min_len < 1].tolist()
+    assert not empty, (
+        "UniProt IDs with an empty structure: {}".format(empty))
+    uneven = group_stats.index[group_stats.n_lens > 1].tolist()
+    assert not uneven, (
+        "UniProt IDs with structures of different lengths: {}".format(uneven))
+    return None
+
+
 def _uni_struct(struct_list):
     """Create composite UniProt structure.
 
     Given a list of pdb secondary structures, create a composite UniProt
     structure of the form '----OOOOXXXOOOO...'
 
-    This will validate that all the structure strings are the same length
-    before proceeding. It returns 'None' if the structure list is empty.
+    The structures are stacked into a 2-D uint8 array with one row per
+    structure, so each position is evaluated with a column-wise
+    reduction instead of character by character. The result is the same
+    as applying _eval_one_pos_struct to every column. All structure
+    strings must be the same length. It returns 'None' if the structure
+    list is empty.
 
     Args:
         struct_list (list of strings): This is a list of all the associated
@@ -67,13 +94,22 @@ def _uni_struct(struct_list):
         None: If the len(struct_list) == 0.
 
     """
-    comp_struct = ''
-    for i in range(len(struct_list[0])):
-        one_pos_struct = []
-        for j in range(len(struct_list)):
-            one_pos_struct.append(struct_list[j][i])
-        comp_struct += _eval_one_pos_struct(one_pos_struct)
-    return comp_struct
+    if len(struct_list) == 0:
+        return None
+    structs = [''.join(struct) for struct in struct_list]
+    width = len(structs[0])
+    assert all(len(struct) == width for struct in structs)
+    struct_array = np.frombuffer(
+        ''.join(structs).encode('ascii'),
+        dtype=np.uint8
+    ).reshape(len(structs), width)
+
+    comp_struct = np.full(width, _STRUCT_CODES['O'], dtype=np.uint8)
+    comp_struct[(struct_array == _STRUCT_CODES['-']).all(axis=0)] = (
+        _STRUCT_CODES['-'])
+    comp_struct[(struct_array == _STRUCT_CODES['X']).any(axis=0)] = (
+        _STRUCT_CODES['X'])
+    return comp_struct.tobytes().decode('ascii')
 
 
 def _eval_one_pos_struct(one_pos_struct):
@@ -1,14 +1,27 @@
 # -*- coding: utf-8 -*-
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
+import os
+
+import numpy as np
 import pandas as pd
-from io import open
-from Bio import SeqIO
-from pdb.lib.data_paths import build_abs_path
 from pdb.lib.progress_bar import ProgressBar
+from pdb.lib.ss_dis_index import SsDisMapping
+from pdb.lib.uni_index import UniProtIndex
+from pdb.lib.uni_store import UniProtStore
+
+# Byte values of the characters used when building a PDB structure.
+_CODES = {code: ord(code) for code in ('-', ' ', 'P')}
+
+_COLUMNS = ['PDB_CHAIN', 'SP_PRIMARY', 'SEC_STRUCT']
 
+# ss_dis indexes opened by worker processes, keyed by path. Each value is
+# (modification time, SsDisMapping), so a rewritten index is reopened.
+_WORKER_SS_DIS = {}
 
-def create_pdb_composite(df, ss_dis, uni_folder):
+
+def create_pdb_composite(df, ss_dis, uni_folder, executor=None,
+                         chunk_size=1000):
     """ Creates a secondary structure composite and outputs a new DataFrame.
 
     1. Goes through the DataFrame row by row, and creates interval_dict.
@@ -32,14 +45,26 @@ def create_pdb_composite(df, ss_dis, uni_folder):
                 }
         uni_folder (Unicode): a directory path to the folder that has single
         UniProt fasta files.
+        executor: Builds the structures of chunks of interval_dict in
+            parallel when given. Anything with an order-preserving
+            map(), such as a multiprocessing Pool or a
+            concurrent.futures ProcessPoolExecutor. If ss_dis is an
+            SsDisMapping, workers open its index by path once instead of
+            being sent the ss_dis entries of each chunk.
+        chunk_size (int): The number of interval_dict keys per chunk.
 
     Returns:
         A new DataFrame with PDB_CHAIN, UNIPROT, SEC_STRUCT.
 
     """
     interval_dict = _create_interval_dict(df)
-    structure_dict = _create_struct_dict(interval_dict, ss_dis, uni_folder)
-    df = pd.DataFrame(structure_dict)
+    if executor is None:
+        structure_dict = _create_struct_dict(
+            interval_dict, ss_dis, uni_folder)
+    else:
+        structure_dict = _create_struct_dict_parallel(
+            interval_dict, ss_dis, uni_folder, executor, chunk_size)
+    df = pd.DataFrame(structure_dict, columns=_COLUMNS)
     return df
 
 
@@ -108,7 +133,8 @@ def _create_struct_dict(interval_dict, ss_dis, uni_folder):
                             ]
                     }
         uni_folder (Unicode): A path to the folder that has single
-            UniProt fasta files.
+            UniProt fasta files. Sequence lengths are read from its
+            UniProt store (see pdb.lib.uni_store).
         ss_dis: a dictionary extracted from ss_dis.txt, in the following form:
             ss_dis[pdb_A] = {
                 'sequence': '',
@@ -125,8 +151,28 @@ def _create_struct_dict(interval_dict, ss_dis, uni_folder):
         }
 
     """
-    structure_dict = {'PDB_CHAIN': [], 'SP_PRIMARY': [], 'SEC_STRUCT': []}
-    for pdb_chain_uni in interval_dict:
+    uni_store = UniProtStore(uni_folder)
+    structure_dict = _build_structures(
+        interval_dict.items(), ss_dis, uni_store)
+    uni_store.close()
+    return structure_dict
+
+
+def _build_structures(items, ss_dis, uni_store):
+    """Return the structure dictionary for (pdb_chain_uni, intervals) pairs.
+
+    Args:
+        items (iterable): (pdb_chain_uni, intervals) pairs from
+            interval_dict.
+        ss_dis: The ss_dis dictionary, or a mapping that behaves like it.
+        uni_store (UniProtStore): An open store for the UniProt lengths.
+
+    Returns:
+        A dictionary in the form returned by _create_struct_dict.
+
+    """
+    structure_dict = {column: [] for column in _COLUMNS}
+    for pdb_chain_uni, intervals in items:
         pdb_chain = ''.join([
             pdb_chain_uni.split('_')[0],
             '_',
@@ -134,14 +180,10 @@ def _create_struct_dict(interval_dict, ss_dis, uni_folder):
         ])
         uni_id = pdb_chain_uni.split('_')[2]
 
-        uni_fp = build_abs_path(uni_folder, uni_id)
-        len_uni_seq = len(
-            (SeqIO.read(open(uni_fp), "fasta")).seq
-        )
+        len_uni_seq = uni_store.length(uni_id)
 
         disorder = ss_dis[pdb_chain]['disorder']
         ss = ss_dis[pdb_chain]['secstr']
-        intervals = interval_dict[pdb_chain_uni]
         pdb_struct = _create_pdb_struct(intervals, disorder, ss, len_uni_seq)
 
         structure_dict['PDB_CHAIN'].append(pdb_chain)
@@ -150,6 +192,98 @@ def _create_struct_dict(interval_dict, ss_dis, uni_folder):
     return structure_dict
 
 
+def _create_struct_dict_parallel(interval_dict, ss_dis, uni_folder,
+                                 executor, chunk_size):
+    """Create the structure dictionary with an executor.
+
+    interval_dict is split into chunks of chunk_size keys, and the
+    chunk results are joined in chunk order, so the rows are in the
+    same order as with _create_struct_dict. The UniProt index is read
+    once here and each chunk is passed only the entries of its UniProt
+    IDs.
+
+    Args:
+        interval_dict (dict): See _create_struct_dict.
+        ss_dis: See _create_struct_dict.
+        uni_folder (Unicode): See _create_struct_dict.
+        executor: An object with an order-preserving map().
+        chunk_size (int): The number of interval_dict keys per chunk.
+
+    Returns:
+        A dictionary in the form returned by _create_struct_dict.
+
+    """
+    if chunk_size < 1:
+        raise ValueError("The chunk size must be at least 1.")
+    items = list(interval_dict.items())
+    chunks = [
+        items[i:i + chunk_size] for i in range(0, len(items), chunk_size)
+    ]
+    # Workers open an index by path; a plain dictionary is sent as the
+    # entries each chunk needs.
+    ss_dis_path = getattr(ss_dis, 'path', None)
+    uni_index = UniProtIndex(uni_folder)
+    tasks = []
+    for chunk in chunks:
+        if ss_dis_path is not None:
+            chunk_ss_dis = ss_dis_path
+        else:
+            chunk_ss_dis = {}
+            for pdb_chain_uni, _ in chunk:
+                pdb_chain = '_'.join(pdb_chain_uni.split('_')[:2])
+                chunk_ss_dis[pdb_chain] = ss_dis[pdb_chain]
+        chunk_entries = uni_index.entries(
+            set(pdb_chain_uni.split('_')[2] for pdb_chain_uni, _ in chunk))
+        tasks.append((chunk, chunk_ss_dis, uni_folder, chunk_entries))
+
+    progress = ProgressBar(
+        len(tasks),
+        start_msg="Creating PDB structures..",
+        end_msg="Done creating PDB structures."
+    )
+    structure_dict = {column: [] for column in _COLUMNS}
+    for chunk_dict in executor.map(_create_struct_chunk, tasks):
+        for column in _COLUMNS:
+            structure_dict[column].extend(chunk_dict[column])
+        progress.inc()
+    return structure_dict
+
+
+def _create_struct_chunk(task):
+    """Return the structure dictionary for one chunk in a worker.
+
+    Args:
+        task (tuple): The chunk's (pdb_chain_uni, intervals) pairs, the
+            path of an ss_dis index or a dictionary of the chunk's
+            ss_dis entries, the UniProt folder and the UniProt index
+            entries of the chunk's UniProt IDs.
+
+    Returns:
+        A dictionary in the form returned by _create_struct_dict.
+
+    """
+    chunk, ss_dis, uni_folder, uni_entries = task
+    if not isinstance(ss_dis, dict):
+        ss_dis = _worker_ss_dis(ss_dis)
+    uni_store = UniProtStore(uni_folder, uni_entries)
+    structure_dict = _build_structures(chunk, ss_dis, uni_store)
+    uni_store.close()
+    return structure_dict
+
+
+def _worker_ss_dis(index_path):
+    """Return an SsDisMapping for index_path, opened once per process."""
+    mtime = os.path.getmtime(index_path)
+    cached = _WORKER_SS_DIS.get(index_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+    ss_dis = SsDisMapping(index_path)
+    _WORKER_SS_DIS[index_path] = (mtime, ss_dis)
+    return ss_dis
+
+
 def _create_pdb_struct(intervals, disorder, ss, uni_seq_len):
     """Create PDB structure.
 
@@ -160,6 +294,10 @@ def _create_pdb_struct(intervals, disorder, ss, uni_seq_len):
         value ('X'), substitutes that value. If neither is present,
         substitutes a 'P'.
 
+    The sequences are handled as uint8 arrays and each interval is
+    mapped with slice operations, in interval order, instead of
+    residue by residue.
+
     Example:
         Given the follow arguments (these don't go together):
             disorder = 'XX----------------------'
@@ -185,18 +323,26 @@ def _create_pdb_struct(intervals, disorder, ss, uni_seq_len):
         A string that represents the secondary structure elements.
 
     """
-    def interval_map(x):
-        return x + (interval[1][0] - interval[0][0])
-    structure = ['-'] * uni_seq_len
+    structure = np.full(uni_seq_len, _CODES['-'], dtype=np.uint8)
+    ss_array = np.frombuffer(ss.encode('ascii'), dtype=np.uint8)
+    disorder_array = np.frombuffer(disorder.encode('ascii'), dtype=np.uint8)
     for interval in intervals:
-        for i in range(interval[0][0] - 1, interval[0][1]):
-            j = interval_map(i)
-            if ss[i] != ' ':
-                structure[j] = ss[i]
-            if disorder[i] != '-':
-                structure[j] = disorder[i]
-            if structure[j] == '-':
-                structure[j] = 'P'
+        res_beg, res_end = interval[0]
+        uni_beg = interval[1][0] - 1
+        uni_end = uni_beg + res_end - res_beg + 1
+        if (res_end > len(ss_array) or
+                res_end > len(disorder_array) or
+                uni_end > uni_seq_len):
+            raise IndexError(
+                "Interval {} is out of range.".format(interval))
+        pdb_ss = ss_array[res_beg - 1:res_end]
+        pdb_disorder = disorder_array[res_beg - 1:res_end]
+        # A view, so the assignments below write into structure.
+        uni_struct = structure[uni_beg:uni_end]
+        np.copyto(uni_struct, pdb_ss, where=pdb_ss != _CODES[' '])
+        np.copyto(
+            uni_struct, pdb_disorder, where=pdb_disorder != _CODES['-'])
+        uni_struct[uni_struct == _CODES['-']] = _CODES['P']
     assert len(structure) == uni_seq_len
-    assert ' ' not in structure
-    return ''.join(structure)
+    assert not (structure == _CODES[' ']).any()
+    return structure.tobytes().decode('ascii')
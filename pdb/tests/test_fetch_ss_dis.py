@@ -86,22 +86,22 @@ class TestSsDisorderData(unittest.TestCase):
     def test_find_matching_datetimes_pass(self):
         filenames = [
             'ss_dis.20151101T020030Z.txt',
-            'ss_dis.20141103T020030Z.json',
+            'ss_dis.20141103T020030Z.bin',
             'ss_dis.20120203T020030Z.txt',
-            'ss_dis.20120203T020030Z.json',
+            'ss_dis.20120203T020030Z.bin',
             'ss_dis.20110203T020030Z.txt',
-            'ss_dis.20110203T020030Z.json'
+            'ss_dis.20110203T020030Z.bin'
         ]
         filenames.sort(reverse=True)
         result = ss._find_matching_datetime_pairs(filenames)
         expected = {
             'files_to_archive': [
                 'ss_dis.20151101T020030Z.txt',
-                'ss_dis.20141103T020030Z.json',
-                'ss_dis.20110203T020030Z.json',
+                'ss_dis.20141103T020030Z.bin',
+                'ss_dis.20110203T020030Z.bin',
                 'ss_dis.20110203T020030Z.txt'],
             'valid_raw_file': 'ss_dis.20120203T020030Z.txt',
-            'valid_json_file': 'ss_dis.20120203T020030Z.json'
+            'valid_bin_file': 'ss_dis.20120203T020030Z.bin'
         }
         self.assertEqual(set(expected), set(result))
         return None
@@ -115,8 +115,8 @@ class TestSsDisorderData(unittest.TestCase):
         """
         filenames = [
             'ss_dis.20151101T020030Z.txt',
-            'ss_dis.20141103T020030Z.json',
-            'ss_dis.20120203T020030Z.json',
+            'ss_dis.20141103T020030Z.bin',
+            'ss_dis.20120203T020030Z.bin',
             'ss_dis.20110203T020030Z.txt',
             'ss_dis.20110203T020030Z.txt'
         ]
@@ -125,12 +125,12 @@ class TestSsDisorderData(unittest.TestCase):
         result = ss._find_matching_datetime_pairs(filenames)
         expected = {
             'files_to_archive': [
-                'ss_dis.20141103T020030Z.json',
-                'ss_dis.20120203T020030Z.json',
+                'ss_dis.20141103T020030Z.bin',
+                'ss_dis.20120203T020030Z.bin',
                 'ss_dis.20110203T020030Z.txt',
                 'ss_dis.20110203T020030Z.txt'],
             'valid_raw_file': 'ss_dis.20151101T020030Z.txt',
-            'valid_json_file': None
+            'valid_bin_file': None
         }
         self.assertEqual(expected, result)
         return None
@@ -143,24 +143,24 @@ class TestSsDisorderData(unittest.TestCase):
 
         """
         filenames = [
-            'ss_dis.20151101T020030Z.json',
-            'ss_dis.20141103T020030Z.json',
-            'ss_dis.20120203T020030Z.json',
-            'ss_dis.20110203T020030Z.json',
-            'ss_dis.20110203T020030Z.json'
+            'ss_dis.20151101T020030Z.bin',
+            'ss_dis.20141103T020030Z.bin',
+            'ss_dis.20120203T020030Z.bin',
+            'ss_dis.20110203T020030Z.bin',
+            'ss_dis.20110203T020030Z.bin'
         ]
         filenames.sort(reverse=True)
 
         result = ss._find_matching_datetime_pairs(filenames)
         expected = {
             'files_to_archive': [
-                'ss_dis.20151101T020030Z.json',
-                'ss_dis.20141103T020030Z.json',
-                'ss_dis.20120203T020030Z.json',
-                'ss_dis.20110203T020030Z.json',
-                'ss_dis.20110203T020030Z.json'],
+                'ss_dis.20151101T020030Z.bin',
+                'ss_dis.20141103T020030Z.bin',
+                'ss_dis.20120203T020030Z.bin',
+                'ss_dis.20110203T020030Z.bin',
+                'ss_dis.20110203T020030Z.bin'],
             'valid_raw_file': None,
-            'valid_json_file': None
+            'valid_bin_file': None
         }
         self.assertEqual(expected, result)
         return None
@@ -173,21 +173,21 @@ class TestSsDisorderData(unittest.TestCase):
         expected = {
             'files_to_archive': [],
             'valid_raw_file': 'ss_dis.20151101T020030Z.txt',
-            'valid_json_file': None
+            'valid_bin_file': None
         }
         result = ss._find_matching_datetime_pairs(filenames)
         self.assertEqual(expected, result)
         return None
 
-    def test_single_datetimes_json_pass(self):
+    def test_single_datetimes_bin_pass(self):
         """find_matching_datetimes()"""
         filenames = [
-            'ss_dis.20151101T020030Z.json'
+            'ss_dis.20151101T020030Z.bin'
         ]
         expected = {
-            'files_to_archive': ['ss_dis.20151101T020030Z.json'],
+            'files_to_archive': ['ss_dis.20151101T020030Z.bin'],
             'valid_raw_file': None,
-            'valid_json_file': None
+            'valid_bin_file': None
         }
         result = ss._find_matching_datetime_pairs(filenames)
         self.assertEqual(expected, result)
@@ -196,13 +196,13 @@ class TestSsDisorderData(unittest.TestCase):
     def test_new_filenames_pass(self):
         estimated_time = now_utc()
         result_names = ss._new_filenames()
-        json_base, json_time, json_ext = result_names.json.split('.')
+        bin_base, bin_time, bin_ext = result_names.bin.split('.')
         raw_base, raw_time, raw_ext = result_names.raw.split('.')
 
-        self.assertEqual(json_time, raw_time)
-        self.assertAlmostEquals(json_time, estimated_time)
-        self.assertEqual({json_base, raw_base, 'ss_dis'}, {'ss_dis'})
-        self.assertEqual(json_ext, 'json')
+        self.assertEqual(bin_time, raw_time)
+        self.assertAlmostEquals(bin_time, estimated_time)
+        self.assertEqual({bin_base, raw_base, 'ss_dis'}, {'ss_dis'})
+        self.assertEqual(bin_ext, 'bin')
         self.assertEqual(raw_ext, 'txt')
         return None
 
@@ -299,21 +299,21 @@ E   TT  TT   S GGGGGG
         assert os.path.isfile(txt_file_path)
         return None
 
-    def test_generate_json(self):
+    def test_generate_bin(self):
         time_stamp = now_utc()
-        json_file_name = (
+        bin_file_name = (
             "{}.{}.{}".format(
                 'ss_dis',
                 time_stamp,
-                'json'
+                'bin'
             )
         )
-        json_file_path = os.path.join(self.temp_dir, json_file_name)
+        bin_file_path = os.path.join(self.temp_dir, bin_file_name)
 
         self.write_fasta(time_stamp)
-        self.assertFalse(os.path.isfile(json_file_path))
+        self.assertFalse(os.path.isfile(bin_file_path))
         ss.fetch_ss_dis(self.temp_dir)
-        self.assertTrue(os.path.isfile(json_file_path))
+        self.assertTrue(os.path.isfile(bin_file_path))
         return None
 
     def test_generate_json_and_return_dic(self):
@@ -336,7 +336,83 @@ E   TT  TT   S GGGGGG
         self.assertEqual(expected, result)
         return None
 
+    def test_return_lazy_mapping_pass(self):
+        time_stamp = now_utc()
+        self.write_fasta(time_stamp)
+        expected = ss.fetch_ss_dis(self.temp_dir)
+        result = ss.fetch_ss_dis(self.temp_dir, lazy=True)
+        self.assertNotIsInstance(result, dict)
+        self.assertIn('5C1Z_B', result)
+        self.assertEqual(expected['5C1Z_B'], result['5C1Z_B'])
+        self.assertEqual(expected, dict(result))
+        return None
+
+    def test_cached_between_calls_pass(self):
+        time_stamp = now_utc()
+        self.write_fasta(time_stamp)
+        first = ss.fetch_ss_dis(self.temp_dir)
+        self.assertIs(first, ss.fetch_ss_dis(self.temp_dir))
+        lazy = ss.fetch_ss_dis(self.temp_dir, lazy=True)
+        self.assertIs(lazy, ss.fetch_ss_dis(self.temp_dir, lazy=True))
+        self.assertEqual(2, len(ss._SS_DIS_CACHE))
+
+        # The cached data can't be changed through the returned view.
+        with self.assertRaises(TypeError):
+            first['1DBO_A']['sequence'] = ''
+        with self.assertRaises(TypeError):
+            del first['5C1Z_B']
+        self.assertEqual(dict(lazy), first)
+        return None
+
+    def test_clear_cache_closes_mapping_pass(self):
+        time_stamp = now_utc()
+        self.write_fasta(time_stamp)
+        lazy = ss.fetch_ss_dis(self.temp_dir, lazy=True)
+        self.assertIn('5C1Z_B', lazy)
+        ss.clear_ss_dis_cache()
+        self.assertTrue(lazy._index._fh.closed)
+        self.assertFalse(ss._SS_DIS_CACHE)
+        return None
+
+    def test_cache_invalidated_on_archive_pass(self):
+        time_stamp = now_utc()
+        self.write_fasta(time_stamp)
+        first = ss.fetch_ss_dis(self.temp_dir)
+        bin_file_path = os.path.join(
+            self.temp_dir,
+            "{}.{}.{}".format('ss_dis', time_stamp, 'bin')
+        )
+        lazy = ss.fetch_ss_dis(self.temp_dir, lazy=True)
+        ss._archive_ss_data(bin_file_path)
+        self.assertTrue(lazy._index._fh.closed)
+        second = ss.fetch_ss_dis(self.temp_dir)
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+        return None
+
+    def test_iter_ss_records_pass(self):
+        time_stamp = now_utc()
+        self.write_fasta(time_stamp)
+        txt_file_path = os.path.join(
+            self.temp_dir,
+            "{}.{}.{}".format('ss_dis', time_stamp, 'txt')
+        )
+        records = list(ss._iter_ss_records(txt_file_path))
+        self.assertEqual(
+            ['1DBO_A', '5C1Z_B'],
+            [record.pdb_chain for record in records]
+        )
+        self.assertEqual(records[0].secstr, '')
+        self.assertEqual(records[0].disorder, '')
+        self.assertTrue(records[0].sequence.startswith('MKMLNKLAGY'))
+        self.assertTrue(records[0].sequence.endswith('KAVIKRNKEH'))
+        self.assertTrue(records[1].secstr.startswith(' EEEEESSSSS'))
+        self.assertTrue(records[1].secstr.endswith('S GGGGGG'))
+        self.assertNotIn('\n', records[1].secstr)
+        return None
+
     def tearDown(self):
+        ss.clear_ss_dis_cache()
         os.chdir(self.original_working_dir)
         try:
             shutil.rmtree(self.temp_dir)
@@ -377,19 +453,19 @@ class TestSsFileValidator(unittest.TestCase):
         expected = {
             'files_to_archive': [],
             'valid_raw_file': None,
-            'valid_json_file': None
+            'valid_bin_file': None
         }
         result = ss._find_existing_files(self.temp_dir)
         self.assertEqual(expected, result)
         return None
 
-    def test_single_json_file_pass(self):
+    def test_single_bin_file_pass(self):
         expected = {
-            'files_to_archive': ['ss_dis.20150101T000000Z.json'],
+            'files_to_archive': ['ss_dis.20150101T000000Z.bin'],
             'valid_raw_file': None,
-            'valid_json_file': None
+            'valid_bin_file': None
         }
-        open("ss_dis.20150101T000000Z.json", 'w', encoding='utf-8').close()
+        open("ss_dis.20150101T000000Z.bin", 'w', encoding='utf-8').close()
         result = ss._find_existing_files(self.temp_dir)
         self.assertEqual(expected, result)
         return None
@@ -399,7 +475,7 @@ class TestSsFileValidator(unittest.TestCase):
             'ss_dis.20121101T020030Z.txt',
             'ss_dis.20131101T020030Z.txt',
             'ss_dis.20151101T020030Z.txt',
-            'ss_dis.20151101T020030Z.json'
+            'ss_dis.20151101T020030Z.bin'
         ]
         for name in ss_files:
             ss_path = os.path.join(
@@ -413,7 +489,7 @@ class TestSsFileValidator(unittest.TestCase):
                 'ss_dis.20131101T020030Z.txt',
                 'ss_dis.20121101T020030Z.txt'],
             'valid_raw_file': 'ss_dis.20151101T020030Z.txt',
-            'valid_json_file': 'ss_dis.20151101T020030Z.json'
+            'valid_bin_file': 'ss_dis.20151101T020030Z.bin'
         }
         result = ss._find_existing_files(self.temp_dir)
         self.assertEqual(expected, result)
@@ -423,8 +499,8 @@ class TestSsFileValidator(unittest.TestCase):
         ss_files = [
             'ss_dis.20131101T020030Z.txt',
             'ss_dis.20101101T020030Z.txt',
-            'ss_dis.20141101T020030Z.json',
-            'ss_dis.20151101T020030Z.json'
+            'ss_dis.20141101T020030Z.bin',
+            'ss_dis.20151101T020030Z.bin'
         ]
         for name in ss_files:
             ss_path = os.path.join(
@@ -435,21 +511,19 @@ class TestSsFileValidator(unittest.TestCase):
 
         expected = {
             'files_to_archive': [
-                'ss_dis.20141101T020030Z.json',
-                'ss_dis.20131101T020030Z.txt',
+                'ss_dis.20151101T020030Z.bin',
+                'ss_dis.20141101T020030Z.bin',
                 'ss_dis.20101101T020030Z.txt'],
-            'valid_raw_file': 'ss_dis.20151101T020030Z.json',
-            'valid_json_file': None
+            'valid_raw_file': 'ss_dis.20131101T020030Z.txt',
+            'valid_bin_file': None
         }
         result = ss._find_existing_files(self.temp_dir)
         self.assertEqual(expected, result)
         return None
 
-    def test_multiple_with_no_txt_pass(self):
+    def test_json_companion_is_archived_pass(self):
         ss_files = [
-            'ss_dis.20131101T020030Z.json',
-            'ss_dis.20101101T020030Z.json',
-            'ss_dis.20141101T020030Z.json',
+            'ss_dis.20151101T020030Z.txt',
             'ss_dis.20151101T020030Z.json'
         ]
         for name in ss_files:
@@ -459,14 +533,37 @@ class TestSsFileValidator(unittest.TestCase):
             )
             open(ss_path, 'w', encoding='utf-8').close()
 
+        expected = {
+            'files_to_archive': ['ss_dis.20151101T020030Z.json'],
+            'valid_raw_file': 'ss_dis.20151101T020030Z.txt',
+            'valid_bin_file': None
+        }
+        result = ss._find_existing_files(self.temp_dir)
+        self.assertEqual(expected, result)
+        return None
+
+    def test_multiple_with_no_txt_pass(self):
+        ss_files = [
+            'ss_dis.20131101T020030Z.bin',
+            'ss_dis.20101101T020030Z.bin',
+            'ss_dis.20141101T020030Z.bin',
+            'ss_dis.20151101T020030Z.bin'
+        ]
+        for name in ss_files:
+            ss_path = os.path.join(
+                self.temp_dir,
+                name
+            )
+            open(ss_path, 'w', encoding='utf-8').close()
+
         expected = {
             'files_to_archive': [
-                'ss_dis.20151101T020030Z.json',
-                'ss_dis.20141101T020030Z.json',
-                'ss_dis.20131101T020030Z.json',
-                'ss_dis.20101101T020030Z.json'],
+                'ss_dis.20151101T020030Z.bin',
+                'ss_dis.20141101T020030Z.bin',
+                'ss_dis.20131101T020030Z.bin',
+                'ss_dis.20101101T020030Z.bin'],
             'valid_raw_file': None,
-            'valid_json_file': None
+            'valid_bin_file': None
         }
         result = ss._find_existing_files(self.temp_dir)
         self.assertEqual(expected, result)
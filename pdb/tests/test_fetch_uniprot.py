@@ -5,14 +5,93 @@ from __future__ import (
 
 import unittest
 import os
+import re
+import shutil
+import threading
+import time
 
 from io import open
 from tempfile import mkdtemp
 
-from pdb.fetch_uniprot import UniProtFetcher
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urlparse import parse_qs, urlparse
+
+from pdb.fetch_uniprot import UniProtFetcher, _split_fasta_records
 from pdb.lib.data_paths import ProjectFolders, find_home_dir
+from pdb.lib.rate_limiter import TokenBucket
+from pdb.lib.uni_store import UNI_STORE_NAME, UniProtStore
 from pdb.tests.test_data import TsvData
 
+UNIPROT_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'uniprot')
+
+# Served as zero-length records, like obsolete UniProt entries.
+OBSOLETE_IDS = ('Q8NI70',)
+
+# Secondary accessions, redirected to (or returned under) their primary.
+MERGED_IDS = {'P99999': 'P00720'}
+
+# A batch request with any other accession is rejected with HTTP 400.
+ACCESSION_PAT = re.compile(
+    '^(?:[OPQ][0-9][A-Z0-9]{3}[0-9]'
+    '|[A-NR-Z][0-9](?:[A-Z][A-Z0-9]{2}[0-9]){1,2})$')
+
+
+class _FastaHandler(BaseHTTPRequestHandler):
+    """Serve fixture FASTA files in place of the UniProt server."""
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/accessions'):
+            return self._send_batch(parse_qs(url.query)['accessions'][0])
+        uni_id = os.path.basename(url.path).split('.')[0]
+        fasta_fp = os.path.join(UNIPROT_FOLDER, uni_id + '.fasta')
+        if uni_id in MERGED_IDS:
+            self.send_response(301)
+            self.send_header(
+                'Location', self.path.replace(uni_id, MERGED_IDS[uni_id]))
+            self.end_headers()
+            return None
+        if uni_id in OBSOLETE_IDS:
+            body = b''
+        elif os.path.isfile(fasta_fp):
+            with open(fasta_fp, 'rb') as fasta_fh:
+                body = fasta_fh.read()
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return None
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return None
+
+    def _send_batch(self, accessions):
+        accessions = accessions.split(',')
+        if not all(ACCESSION_PAT.match(uni_id) for uni_id in accessions):
+            self.send_response(400)
+            self.end_headers()
+            return None
+        body = b''
+        for uni_id in accessions:
+            uni_id = MERGED_IDS.get(uni_id, uni_id)
+            fasta_fp = os.path.join(UNIPROT_FOLDER, uni_id + '.fasta')
+            if uni_id not in OBSOLETE_IDS and os.path.isfile(fasta_fp):
+                with open(fasta_fp, 'rb') as fasta_fh:
+                    body += fasta_fh.read()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return None
+
+    def log_message(self, *args):
+        return None
+
 
 class TestLoadUniProt(unittest.TestCase):
     def _write_mock_tsv(self):
@@ -60,5 +139,202 @@ class TestLoadUniProt(unittest.TestCase):
         self.assertTrue(uni_id in fetcher.obs)
         return None
 
+
+class TestConcurrentFetch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = mkdtemp(prefix='pdb-tests_')
+        self.dirs = ProjectFolders(
+            project_home=self.temp_dir,
+            uni_data=os.path.join(self.temp_dir, 'uni_data'),
+            working=os.path.join(self.temp_dir, 'working')
+        )
+        os.makedirs(self.dirs.uni_data)
+        os.makedirs(self.dirs.working)
+
+        self.found = ['P00669', 'P00720', 'P01100', 'P20932', 'Q9RN68']
+        self.obsolete = ['Q8NI70', 'P123451']
+        tsv_lines = ['\tPDB\tCHAIN\tSP_PRIMARY\n']
+        for i, uni_id in enumerate(self.found + self.obsolete):
+            tsv_lines.append('{0}\t{0}ABC\tA\t{1}\n'.format(i, uni_id))
+        tsv_fp = os.path.join(self.dirs.working, 'pdb_seq.tsv')
+        with open(tsv_fp, 'w', encoding='utf-8') as tsv_fh:
+            tsv_fh.writelines(tsv_lines)
+
+        self.server = HTTPServer(('127.0.0.1', 0), _FastaHandler)
+        self.server_thread = threading.Thread(
+            target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.uni_url = 'http://127.0.0.1:{}/uniprot/{{}}.fasta'.format(
+            self.server.server_address[1])
+        self.batch_url = (
+            'http://127.0.0.1:{}/accessions?accessions={{}}'.format(
+                self.server.server_address[1]))
+        return None
+
+    def _assert_stored(self):
+        with UniProtStore(UNIPROT_FOLDER) as fixtures, \
+                UniProtStore(self.dirs.uni_data) as uni_store:
+            for uni_id in self.found:
+                self.assertIn(uni_id, uni_store)
+                self.assertEqual(fixtures.get(uni_id), uni_store.get(uni_id))
+            for uni_id in self.obsolete:
+                self.assertTrue(uni_store.is_obsolete(uni_id))
+        return None
+
+    def test_concurrent_fetch_pass(self):
+        fetcher = UniProtFetcher(
+            self.dirs, workers=4, rate=100, uni_url=self.uni_url)
+        fetcher.fetch_fasta_files()
+
+        self._assert_stored()
+        self.assertEqual(sorted(self.obsolete), sorted(fetcher.obs))
+        self.assertEqual([], fetcher.missing)
+        self.assertEqual(
+            sorted(self.found), sorted(fetcher.df.SP_PRIMARY.tolist()))
+        return None
+
+    def test_batch_fetch_pass(self):
+        fetcher = UniProtFetcher(
+            self.dirs,
+            workers=2,
+            rate=100,
+            uni_url=self.uni_url,
+            batch_size=3,
+            batch_url=self.batch_url
+        )
+        fetcher.fetch_fasta_files()
+
+        self._assert_stored()
+        self.assertEqual(sorted(self.obsolete), sorted(fetcher.obs))
+        self.assertEqual([], fetcher.missing)
+        return None
+
+    def test_refresh_old_records_pass(self):
+        fetcher = UniProtFetcher(self.dirs, rate=100, uni_url=self.uni_url)
+        fetcher.fetch_fasta_files()
+        store_fp = os.path.join(self.dirs.uni_data, UNI_STORE_NAME)
+        size = os.path.getsize(store_fp)
+
+        # Nothing is old enough, so nothing is requested.
+        self.server.shutdown()
+        fetcher = UniProtFetcher(
+            self.dirs, rate=100, uni_url=self.uni_url, max_age_days=1)
+        fetcher.fetch_fasta_files()
+        self.assertEqual([], fetcher.missing)
+
+        # Every record is refreshed, but a failed refresh keeps the
+        # stored record.
+        fetcher = UniProtFetcher(
+            self.dirs, rate=100, uni_url=self.uni_url, max_age_days=0)
+        fetcher.fetch_fasta_files()
+        self.assertEqual([], fetcher.missing)
+        self.assertEqual(
+            sorted(self.found), sorted(fetcher.df.SP_PRIMARY.tolist()))
+        self.assertEqual(size, os.path.getsize(store_fp))
+        return None
+
+    def test_batch_server_down_missing_pass(self):
+        self.server.shutdown()
+        self.server.server_close()
+        fetcher = UniProtFetcher(
+            self.dirs, rate=100, batch_size=5, batch_url=self.batch_url)
+        result = fetcher._download_batch(self.found)
+        self.assertEqual([(uni_id, None) for uni_id in self.found], result)
+        self.assertEqual(self.found, fetcher.missing)
+        self.assertEqual([], fetcher.obs)
+        return None
+
+    def test_batch_merged_accession_pass(self):
+        fetcher = UniProtFetcher(
+            self.dirs, rate=100, uni_url=self.uni_url,
+            batch_size=5, batch_url=self.batch_url)
+        result = dict(fetcher._download_batch(['P00669', 'P99999']))
+        with UniProtStore(UNIPROT_FOLDER) as fixtures, \
+                UniProtStore(self.dirs.uni_data) as uni_store:
+            uni_store.put('P99999', result['P99999'])
+            self.assertEqual(fixtures.get('P00720'), uni_store.get('P99999'))
+        self.assertIsNotNone(result['P00669'])
+        self.assertEqual([], fetcher.obs)
+        self.assertEqual([], fetcher.missing)
+        return None
+
+    def test_batch_rejected_falls_back_pass(self):
+        fetcher = UniProtFetcher(
+            self.dirs, rate=100, uni_url=self.uni_url,
+            batch_size=5, batch_url=self.batch_url)
+        result = dict(fetcher._download_batch(['P00669', 'P123451']))
+        self.assertIsNotNone(result['P00669'])
+        self.assertIsNone(result['P123451'])
+        self.assertEqual(['P123451'], fetcher.obs)
+        self.assertEqual([], fetcher.missing)
+        return None
+
+    def test_split_fasta_records_pass(self):
+        lines = [
+            '>sp|P00720|ENLYS_BPT4 Endolysin OS=Enterobacteria phage T4',
+            'MNIFEMLRID',
+            'EGLRLKIYKD',
+            '>tr|Q9RN68|Q9RN68_9NEIS Uncharacterized protein',
+            'MKKLLIAL'
+        ]
+        self.assertEqual(
+            [
+                ('P00720', '{}\nMNIFEMLRID\nEGLRLKIYKD\n'.format(lines[0])),
+                ('Q9RN68', '{}\nMKKLLIAL\n'.format(lines[3]))
+            ],
+            list(_split_fasta_records(lines))
+        )
+        return None
+
+    def test_existing_files_not_downloaded_pass(self):
+        self.server.shutdown()
+        for uni_id in self.found:
+            shutil.copy(
+                os.path.join(UNIPROT_FOLDER, uni_id + '.fasta'),
+                self.dirs.uni_data
+            )
+        for uni_id in self.obsolete:
+            open(
+                os.path.join(self.dirs.uni_data, uni_id + '.fasta'), 'w'
+            ).close()
+        fetcher = UniProtFetcher(
+            self.dirs, workers=4, rate=100, uni_url=self.uni_url)
+        fetcher.fetch_fasta_files()
+        self._assert_stored()
+        self.assertEqual(sorted(self.obsolete), sorted(fetcher.obs))
+        self.assertEqual([], fetcher.missing)
+
+        # The first run removed the obsolete rows from pdb_seq.tsv, and
+        # a second run finds every remaining ID in the store.
+        fetcher = UniProtFetcher(
+            self.dirs, workers=4, rate=100, uni_url=self.uni_url)
+        fetcher.fetch_fasta_files()
+        self.assertEqual([], fetcher.obs)
+        self.assertEqual([], fetcher.missing)
+        return None
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+        return None
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate_pass(self):
+        bucket = TokenBucket(rate=50)
+        start = time.time()
+        for _ in range(11):
+            bucket.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.18)
+        return None
+
+    def test_invalid_rate_fail(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+        return None
+
+
 if __name__ == '__main__':
     unittest.main()
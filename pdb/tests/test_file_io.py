@@ -10,7 +10,16 @@ import tempfile
 import unittest
 from os.path import exists
 
-from pdb.lib.file_io import write_json, read_json
+import pandas as pd
+
+try:
+    from pandas.testing import assert_frame_equal
+except ImportError:
+    from pandas.util.testing import assert_frame_equal  # pandas < 0.20
+
+from pdb.lib.file_io import (
+    find_frame, frame_path, id_set_path, pyarrow, read_frame, read_id_set,
+    read_json, read_yaml, write_frame, write_id_set, write_json, write_yaml)
 
 
 class TestJsonIO(unittest.TestCase):
@@ -78,5 +87,113 @@ class TestJsonIO(unittest.TestCase):
         shutil.rmtree(self.temp_dir)
 
 
+class TestFrameIO(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        self.df = pd.DataFrame(
+            {
+                'PDB_CHAIN': ['104L_A', '104L_B', '11BG_A'],
+                'SP_PRIMARY': ['P00720', 'P00720', 'P00669'],
+                'SEC_STRUCT': ['--PPHHX', '--PPHXX', 'XX-EEPP'],
+                'SP_BEG': [1, 41, 27]
+            },
+            columns=['PDB_CHAIN', 'SP_PRIMARY', 'SEC_STRUCT', 'SP_BEG'],
+            index=[3, 7, 12]
+        )
+
+    def _round_trip(self, frame_format):
+        path = frame_path(self.temp_dir, 'pdb_seq', frame_format)
+        write_frame(self.df, path)
+        self.assertEqual(path, find_frame(self.temp_dir, 'pdb_seq'))
+        assert_frame_equal(self.df, read_frame(path))
+        return None
+
+    def test_pickle_round_trip_pass(self):
+        self._round_trip('pickle')
+        return None
+
+    def test_tsv_round_trip_pass(self):
+        self._round_trip('tsv')
+        return None
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed.")
+    def test_feather_round_trip_pass(self):
+        self._round_trip('feather')
+        return None
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed.")
+    def test_parquet_round_trip_pass(self):
+        self._round_trip('parquet')
+        return None
+
+    def test_find_frame_pass(self):
+        self.assertIsNone(find_frame(self.temp_dir, 'pdb_seq'))
+        write_frame(self.df, frame_path(self.temp_dir, 'pdb_seq', 'tsv'))
+        write_frame(self.df, frame_path(self.temp_dir, 'pdb_seq', 'pickle'))
+        self.assertEqual(
+            os.path.join(self.temp_dir, 'pdb_seq.pkl'),
+            find_frame(self.temp_dir, 'pdb_seq'))
+        return None
+
+    def test_unknown_format_fail(self):
+        with self.assertRaises(ValueError):
+            frame_path(self.temp_dir, 'pdb_seq', 'csv')
+        with self.assertRaises(ValueError):
+            read_frame(os.path.join(self.temp_dir, 'pdb_seq.csv'))
+        return None
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestIdSetIO(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        self.ids = ['104L', '101M', '10GS', '101M']
+
+    def test_id_set_round_trip_pass(self):
+        ids_fp = id_set_path(self.temp_dir, 'xray')
+        self.assertEqual(os.path.join(self.temp_dir, 'xray.ids'), ids_fp)
+        write_id_set(self.ids, ids_fp)
+        with open(ids_fp, 'r') as ids_fh:
+            self.assertEqual('101M\n104L\n10GS\n', ids_fh.read())
+        self.assertEqual(frozenset(self.ids), read_id_set(ids_fp))
+        return None
+
+    def test_yaml_fallback_pass(self):
+        yaml_fp = os.path.join(self.temp_dir, 'obs.yaml')
+        write_yaml(self.ids, yaml_fp)
+        self.assertEqual(yaml_fp, id_set_path(self.temp_dir, 'obs'))
+        self.assertEqual(frozenset(self.ids), read_id_set(yaml_fp))
+
+        write_id_set(self.ids, os.path.join(self.temp_dir, 'obs.ids'))
+        self.assertEqual(
+            os.path.join(self.temp_dir, 'obs.ids'),
+            id_set_path(self.temp_dir, 'obs'))
+        return None
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestYamlIO(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        self.data = {
+            'SP_PRIMARY': {'0': 'P00720', '1': 'P25644'},
+            'MISSING': {'0': [[1, 4, 'null']], '1': []},
+            'STRUCT': {'0': None, '1': '123'}
+        }
+
+    def test_yaml_round_trip_pass(self):
+        yaml_fp = os.path.join(self.temp_dir, 'data.yaml')
+        write_yaml(self.data, yaml_fp)
+        self.assertEqual(self.data, read_yaml(yaml_fp))
+        return None
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
 if __name__ == '__main__':
     unittest.main()
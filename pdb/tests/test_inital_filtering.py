@@ -89,7 +89,7 @@ class TestGenerateInitialFilteringData(unittest.TestCase):
             self.dirs.working,
             'pdb_seq.tsv'
         )
-        initial_filtering(self.dirs)
+        initial_filtering(self.dirs, frame_format='tsv')
         set_write_permissions(self.temp_dir)
         self.assertTrue(exists(result_pdb_seq_fp))
         self.assertTrue(
@@ -3,18 +3,41 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
 import os
+import shutil
+import tempfile
 import unittest
 
+from multiprocessing import Pool
+
 import pandas as pd
-from pandas.util.testing import assert_frame_equal
+
+try:
+    from pandas.testing import assert_frame_equal
+except ImportError:
+    from pandas.util.testing import assert_frame_equal  # pandas < 0.20
 
 import pdb.filtering_step_one
+import pdb.filtering_step_three
 import pdb.filtering_step_two
 import pdb.lib.create_pdb_intervals
 import pdb.lib.pdb_tools
 import pdb.lib.uni_tools
 import pdb.pdb_composite
 import pdb.tests.test_data as test_data
+from pdb.lib.data_paths import ProjectFolders
+from pdb.lib.ss_dis_index import SsDisMapping, write_ss_index
+from pdb.lib.uni_index import UNI_INDEX_NAME
+from pdb.lib.uni_store import UNI_STORE_NAME, import_fasta_folder
+
+
+class _MapExecutor(object):
+    """An executor that runs a callback before mapping in this process."""
+    def __init__(self, before_map):
+        self.before_map = before_map
+
+    def map(self, func, tasks):
+        self.before_map()
+        return [func(task) for task in tasks]
 
 
 class TestFiltering(unittest.TestCase):
@@ -41,6 +64,49 @@ class TestFiltering(unittest.TestCase):
         result = pdb.filtering_step_one.filter_pdb_chain_uniprot(df, obs, xray)
         assert_frame_equal(expected, result)
 
+    def test_read_pdb_chain_uniprot(self):
+        chain_fp = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'data', 'initial_filtering_data', 'tsv_data',
+            'pdb_chain_uniprot.tsv')
+        df = pdb.lib.pdb_tools.read_pdb_chain_uniprot(chain_fp)
+        self.assertEqual(
+            ['PDB', 'CHAIN', 'SP_PRIMARY', 'RES_BEG', 'RES_END', 'SP_BEG',
+             'SP_END'],
+            df.columns.tolist())
+        self.assertEqual('category', df.SP_PRIMARY.dtype.name)
+        self.assertEqual('int32', df.RES_BEG.dtype.name)
+        self.assertEqual(('101m', 'A', 'P02185', 1, 154, 1, 154),
+                         tuple(df.iloc[0]))
+
+        # The loader already skips PDB_BEG and PDB_END.
+        xray = df.PDB.str.upper().unique().tolist()
+        result = pdb.filtering_step_one.filter_pdb_chain_uniprot(
+            df, [], xray)
+        self.assertEqual('category', result.PDB.dtype.name)
+        self.assertTrue(len(result.index) > 0)
+
+    def test_read_pdb_chain_uniprot_chunks(self):
+        """Filtering chunks keeps the same rows as filtering the file."""
+        chain_fp = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'data', 'initial_filtering_data', 'tsv_data',
+            'pdb_chain_uniprot.tsv')
+        obs = ['104L']
+        xray = ['101M', '102L', '103L', '104L', '107L', '108L', '109L']
+        expected = pdb.filtering_step_one.filter_pdb_chain_uniprot(
+            pdb.lib.pdb_tools.read_pdb_chain_uniprot(chain_fp), obs, xray)
+        result = pdb.lib.pdb_tools.read_pdb_chain_uniprot(
+            chain_fp,
+            row_filter=lambda chunk: pdb.filtering_step_one._filter_rows(
+                chunk, obs, xray),
+            chunksize=3
+        )
+        result = pdb.lib.pdb_tools.filter_single(result)
+        self.assertTrue(len(expected.index) > 0)
+        assert_frame_equal(
+            expected.astype(object), result.astype(object))
+
     def test_add_pdbseq_to_df(self):
         """Remove 103L, 3V44, 3V47.
 
@@ -63,6 +129,19 @@ class TestFiltering(unittest.TestCase):
         result.sort_index(axis=1, inplace=True)
         assert_frame_equal(result, expected)
 
+    def test_add_pdbseq_to_df_malformed_key(self):
+        """Drop rows whose PDB or CHAIN can't form a PDB_CHAIN key."""
+        df = pd.DataFrame(test_data.PDBParseData.add_pdbseq_to_df_input)
+        df.loc[4, 'CHAIN'] = float('nan')
+        result = pdb.filtering_step_one.add_pdbseq_to_df(
+            df,
+            test_data.PDBParseData.ss_dis)
+        self.assertNotIn(4, result.index)
+        self.assertEqual(7, len(result.index))
+        self.assertEqual(
+            'MNIFEMLRIDEGLRLKIYKDTEGYYTIGIGHLLTKSPSLN',
+            result.loc[0, 'PDB_SEQ'])
+
     def test_filter_single_pdb_chain_sep(self):
         expected = pd.DataFrame(
             test_data.PDBParseData.filter_single_pdb_chain_sep_expected
@@ -83,6 +162,17 @@ class TestFiltering(unittest.TestCase):
         del result['index']
         assert_frame_equal(expected, result)
 
+    def test_filter_single_counts_unique_chains(self):
+        """P00669 has two rows, but both are on 11BG_A."""
+        df = pd.DataFrame(
+            test_data.PDBParseData.filter_single_pdb_chain_sep_input)
+        df.loc[5, 'CHAIN'] = 'A'
+        df.loc[0, 'CHAIN'] = None
+        result = pdb.lib.pdb_tools.filter_single(df)
+        self.assertNotIn('P00669', result.SP_PRIMARY.tolist())
+        self.assertIn(0, result.index)
+        self.assertEqual(12, len(result.index))
+
     def test_compare_to_uni(self):
         """
         Remove all entries related to P00720,
@@ -99,6 +189,65 @@ class TestFiltering(unittest.TestCase):
         result.sort_index(axis=1, inplace=True)
         assert_frame_equal(expected, result)
 
+    def test_compare_to_uni_keeps_obsolete(self):
+        """Rows of obsolete UniProt IDs are not compared."""
+        temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        uni_folder = os.path.join(temp_dir, 'uniprot')
+        shutil.copytree(self.uniprot_folder, uni_folder)
+        open(os.path.join(uni_folder, 'Q8NI70.fasta'), 'w').close()
+        df = pd.DataFrame(test_data.PDBParseData.compare_to_uni_input)
+        df.loc[0, 'SP_PRIMARY'] = 'Q8NI70'
+        result = pdb.filtering_step_two.compare_to_uni(df, uni_folder)
+        shutil.rmtree(temp_dir)
+        self.assertEqual([0, 2, 3], result.index.tolist())
+        self.assertNotIn('PDB_SEQ', result.columns)
+
+    def test_compare_to_uni_keeps_unknown(self):
+        """Rows of UniProt IDs with no sequence on disk are kept."""
+        df = pd.DataFrame(test_data.PDBParseData.compare_to_uni_input)
+        df.loc[0, 'SP_PRIMARY'] = 'P99999'
+        result = pdb.filtering_step_two.compare_to_uni(
+            df, self.uniprot_folder)
+        self.assertEqual([0, 2, 3], result.index.tolist())
+
+    def test_compare_to_uni_workers(self):
+        """A process pool keeps the same rows in the same order."""
+        df = pd.DataFrame(test_data.PDBParseData.compare_to_uni_input)
+        expected = pdb.filtering_step_two.compare_to_uni(
+            df.copy(), self.uniprot_folder, workers=1)
+        result = pdb.filtering_step_two.compare_to_uni(
+            df, self.uniprot_folder, workers=3)
+        assert_frame_equal(expected, result)
+
+    def test_missing_stage_input_fail(self):
+        """Stages raise IOError when the previous stage's file is absent."""
+        temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        dirs = ProjectFolders(
+            project_home=temp_dir,
+            uni_data=temp_dir,
+            tsv_data=temp_dir,
+            working=temp_dir
+        )
+        try:
+            with self.assertRaises(IOError):
+                pdb.filtering_step_two.second_filtering(dirs)
+            with self.assertRaises(IOError):
+                pdb.filtering_step_three.final_filtering(dirs)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_shard_rows(self):
+        uni_ids = pd.DataFrame(
+            test_data.PDBParseData.compare_to_uni_input).SP_PRIMARY.values
+        shards = pdb.filtering_step_two._shard_rows(uni_ids, 4)
+        self.assertEqual(
+            list(range(len(uni_ids))),
+            sorted(position for shard in shards for position in shard))
+        shard_ids = [set(uni_ids[shard]) for shard in shards]
+        self.assertEqual(
+            len(set(uni_ids)), sum(len(ids) for ids in shard_ids))
+        self.assertEqual([], pdb.filtering_step_two._shard_rows(uni_ids[:0], 4))
+
     def test_read_pdb_chain_uniprot_uniIDs(self):
         expected = ['P00718', 'P00720', 'P00669', 'Q4G1L2', 'B3DIN1']
         df = pd.DataFrame(
@@ -135,6 +284,66 @@ class TestPDBSeq(unittest.TestCase):
         assert_frame_equal(expected_sort, result_sort)
         return None
 
+    def test_create_pdb_composite_index_entries(self):
+        """Chunk tasks carry the UniProt index entries they need."""
+        ss_dis = test_data.PDBParseData.ss_dis
+        df = pd.DataFrame(test_data.PDBParseData.create_pdb_composite_input)
+        expected = pdb.pdb_composite.create_pdb_composite(
+            df, ss_dis, self.uniprot_folder)
+
+        temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        uni_folder = os.path.join(temp_dir, 'uniprot')
+        shutil.copytree(self.uniprot_folder, uni_folder)
+        import_fasta_folder(uni_folder)
+
+        # Lengths can then only come from the entries in the tasks.
+        def remove_sources():
+            os.remove(os.path.join(uni_folder, UNI_INDEX_NAME))
+            for file_name in os.listdir(uni_folder):
+                if file_name != UNI_STORE_NAME:
+                    os.remove(os.path.join(uni_folder, file_name))
+
+        try:
+            result = pdb.pdb_composite.create_pdb_composite(
+                df, ss_dis, uni_folder,
+                executor=_MapExecutor(remove_sources), chunk_size=1)
+            assert_frame_equal(expected, result)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_create_pdb_composite_executor(self):
+        """Chunks built in worker processes keep the serial row order."""
+        ss_dis = test_data.PDBParseData.ss_dis
+        df = pd.DataFrame(test_data.PDBParseData.create_pdb_composite_input)
+        expected = pdb.pdb_composite.create_pdb_composite(
+            df, ss_dis, self.uniprot_folder)
+
+        temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        index_path = os.path.join(temp_dir, 'ss_dis.bin')
+        write_ss_index(
+            (
+                (pdb_chain, entry['sequence'], entry['secstr'],
+                 entry['disorder'])
+                for pdb_chain, entry in ss_dis.items()
+            ),
+            index_path
+        )
+        pool = Pool(2)
+        try:
+            result = pdb.pdb_composite.create_pdb_composite(
+                df, ss_dis, self.uniprot_folder, executor=pool,
+                chunk_size=1)
+            assert_frame_equal(expected, result)
+            with SsDisMapping(index_path) as ss_index:
+                result = pdb.pdb_composite.create_pdb_composite(
+                    df, ss_index, self.uniprot_folder, executor=pool,
+                    chunk_size=2)
+            assert_frame_equal(expected, result)
+        finally:
+            pool.close()
+            pool.join()
+            shutil.rmtree(temp_dir)
+
     def test_create_pdb_struct(self):
         expected = '---------------------XXXXTTPPE----SSPHHHHHHHH---------------'
         ss = '     TT  EE   SS HHHHHHHHHHHT  TEEEEEEEE  SGGG    '
@@ -271,6 +480,21 @@ class TestUniStruct(unittest.TestCase):
         result = pdb.lib.uni_tools._uni_struct(struct_list)
         self.assertEqual(expected, result)
 
+    def test_uni_struct_matches_one_pos_struct(self):
+        struct_list = [
+            test_data.PDBParseData.create_uni_struct_input['SEC_STRUCT'][i]
+            for i in (1, 4)
+        ]
+        struct_list.append('X' * len(struct_list[0]))
+        struct_list[2] = '-' * 30 + struct_list[1][30:]
+        expected = ''.join(
+            pdb.lib.uni_tools._eval_one_pos_struct(list(column))
+            for column in zip(*struct_list)
+        )
+        result = pdb.lib.uni_tools._uni_struct(struct_list)
+        self.assertEqual(expected, result)
+        self.assertIsNone(pdb.lib.uni_tools._uni_struct([]))
+
     def test_create_uni_struct(self):
         expected = pd.DataFrame(
             test_data.PDBParseData.create_uni_struct_expected)
@@ -289,6 +513,15 @@ class TestUniStruct(unittest.TestCase):
         assert_frame_equal(expected_sort, result_sort)
         return None
 
+    def test_create_uni_struct_validation_fail(self):
+        df = pd.DataFrame(test_data.PDBParseData.create_uni_struct_input)
+        with self.assertRaises(AssertionError):
+            pdb.lib.uni_tools.create_uni_struct(df.drop(4))
+        df.loc[2, 'SEC_STRUCT'] = df.loc[2, 'SEC_STRUCT'][1:]
+        with self.assertRaises(AssertionError):
+            pdb.lib.uni_tools.create_uni_struct(df)
+        return None
+
 
 class TestMissRegions(unittest.TestCase):
 
@@ -301,6 +534,24 @@ class TestMissRegions(unittest.TestCase):
         result = pdb.lib.create_pdb_intervals._find_indexes(uni_struct)
         self.assertEqual(expected, result)
 
+    def test_find_indexes_lowercase(self):
+        self.assertEqual(
+            [(0, 3), (5, 6)],
+            pdb.lib.create_pdb_intervals._find_indexes('XxXOOx'))
+        self.assertEqual(
+            [], pdb.lib.create_pdb_intervals._find_indexes(''))
+
+    def test_find_missing_spans(self):
+        find_missing_spans = pdb.lib.create_pdb_intervals.find_missing_spans
+        span_ids, starts, ends = find_missing_spans(
+            ['P1', 'P2', 'P3', 'P4'],
+            ['-XXXPHX-HHXX', 'OOOO', 'X', 'XXOX']
+        )
+        self.assertEqual(
+            ['P1', 'P1', 'P1', 'P3', 'P4', 'P4'], span_ids.tolist())
+        self.assertEqual([1, 6, 10, 0, 0, 3], starts.tolist())
+        self.assertEqual([4, 7, 12, 1, 2, 4], ends.tolist())
+
     def test_create_intervals(self):
         expected = pd.DataFrame(
             test_data.PDBParseData.create_intervals_expected)
@@ -315,6 +566,57 @@ class TestMissRegions(unittest.TestCase):
         result.sort_index(axis=1, inplace=True)
         assert_frame_equal(expected, result)
 
+    def test_create_intervals_missing(self):
+        expected = test_data.PDBParseData.create_intervals_expected
+        pdb_df = pd.DataFrame(test_data.PDBParseData.create_intervals_pdb_df)
+        uni_df = pd.DataFrame(test_data.PDBParseData.create_intervals_uni_df)
+        result = pdb.lib.create_pdb_intervals.create_intervals(pdb_df, uni_df)
+        self.assertEqual(
+            [expected['MISSING'][10068], expected['MISSING'][15401]],
+            result.MISSING.tolist())
+
+    def test_classify_regions(self):
+        """Regions are the column ranges of one structure array."""
+        structs = pdb.lib.create_pdb_intervals._struct_array(
+            ['XXXXXP-XX', 'XXPXXPXX-', '-XPXXHX-X'], 9)
+        result = pdb.lib.create_pdb_intervals.classify_regions(
+            structs, [0, 3, 5, 6, 3], [3, 5, 6, 9, 3])
+        self.assertEqual(
+            ['contained', 'conserved', 'conflict', 'overlap', 'conflict'],
+            result.tolist())
+        self.assertEqual(
+            ['discarded'],
+            pdb.lib.create_pdb_intervals.classify_regions(
+                structs[:1]).tolist())
+
+    def test_region_types(self):
+        """Each disorder type, including mixed rows and no rows."""
+        sis = [
+            (['XXX', 'XXP', '-XP'], 'contained'),
+            (['XXX', 'XXX', 'XXX'], 'conserved'),
+            (['XXX', 'PPP', '-XP'], 'conflict'),
+            (['XX-', 'PPX', '-X-'], 'overlap'),
+            (['XPX', '-P-', '-P-'], 'discarded'),
+            ([], 'discarded')
+        ]
+        for si, dis_type in sis:
+            structs = pdb.lib.create_pdb_intervals._struct_array(si, 3)
+            self.assertEqual(
+                [dis_type],
+                pdb.lib.create_pdb_intervals.classify_regions(
+                    structs).tolist())
+            self.assertEqual(
+                dis_type,
+                pdb.lib.create_pdb_intervals.determine_dis_type(si))
+
+        # The same regions side by side in one structure array.
+        rows = [''.join(row) for row in zip(*[si for si, _ in sis[:5]])]
+        structs = pdb.lib.create_pdb_intervals._struct_array(rows, 15)
+        self.assertEqual(
+            [dis_type for _, dis_type in sis[:5]],
+            pdb.lib.create_pdb_intervals.classify_regions(
+                structs, [0, 3, 6, 9, 12], [3, 6, 9, 12, 15]).tolist())
+
     def test_qualifies(self):
         sis1 = ['XXX', 'XXP', '-XP']
         sis2 = ['XXX', 'XXX', 'XXX']
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Test lib.ss_dis_index."""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from io import open
+
+from pdb.lib.ss_dis_index import (
+    SsDisIndex, SsDisMapping, SsDisView, read_ss_index, write_ss_index)
+
+
+class TestSsDisIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        self.index_path = os.path.join(
+            self.temp_dir, 'ss_dis.20151101T020030Z.bin')
+        self.records = [
+            ('1A5J_A', 'GIPDLVKGPW', '   SS SS  ', '----------'),
+            ('104L_B', 'MNIFEMLRID', '  HHHHHHHH', 'XX--------'),
+            ('1A4L_AA', 'TPAFNKPKV', '  S  S EE', '---------'),
+            ('1DBO_A', 'MKMLNKLAGY', '', '')
+        ]
+        return None
+
+    def test_write_and_read_index_pass(self):
+        write_ss_index(iter(self.records), self.index_path)
+        self.assertTrue(os.path.isfile(self.index_path))
+        self.assertFalse(os.path.isfile(self.index_path + '.tmp'))
+
+        expected = {
+            pdb_chain: {
+                'sequence': sequence,
+                'secstr': secstr,
+                'disorder': disorder
+            }
+            for pdb_chain, sequence, secstr, disorder in self.records
+        }
+        self.assertEqual(expected, read_ss_index(self.index_path))
+        return None
+
+    def test_lookup_pass(self):
+        write_ss_index(self.records, self.index_path)
+        with SsDisIndex(self.index_path) as ss_index:
+            self.assertEqual(len(self.records), len(ss_index))
+            self.assertIn('1A4L_AA', ss_index)
+            self.assertNotIn('1A4L_A', ss_index)
+            self.assertNotIn(None, ss_index)
+            self.assertEqual(
+                ('MNIFEMLRID', '  HHHHHHHH', 'XX--------'),
+                ss_index.record('104L_B')
+            )
+            self.assertEqual(
+                sorted(record[0] for record in self.records),
+                list(ss_index)
+            )
+            with self.assertRaises(KeyError):
+                ss_index.record('9XYZ_A')
+        return None
+
+    def test_invalid_file_fail(self):
+        with open(self.index_path, 'wb') as bad_fh:
+            bad_fh.write(b'{"101M_A": {}}' * 4)
+        with self.assertRaises(RuntimeError):
+            SsDisIndex(self.index_path)
+        return None
+
+    def test_mapping_matches_dictionary_pass(self):
+        write_ss_index(self.records, self.index_path)
+        expected = read_ss_index(self.index_path)
+        with SsDisMapping(self.index_path, cache_size=2) as ss_dis:
+            self.assertEqual(expected, dict(ss_dis))
+            self.assertEqual(len(expected), len(ss_dis))
+            self.assertIn('1DBO_A', ss_dis.keys())
+            self.assertNotIn('9XYZ_A', ss_dis)
+            self.assertEqual(
+                'MNIFEMLRID', ss_dis['104L_B']['sequence'])
+            self.assertIsNone(ss_dis.get('9XYZ_A'))
+        return None
+
+    def test_mapping_cache_is_bounded_pass(self):
+        write_ss_index(self.records, self.index_path)
+        with SsDisMapping(self.index_path, cache_size=2) as ss_dis:
+            first = ss_dis['104L_B']
+            ss_dis['1A5J_A']
+            self.assertIs(first, ss_dis['104L_B'])
+            ss_dis['1DBO_A']
+            self.assertEqual(
+                ['104L_B', '1DBO_A'], list(ss_dis._cache))
+        return None
+
+    def test_view_is_read_only_pass(self):
+        write_ss_index(self.records, self.index_path)
+        expected = read_ss_index(self.index_path)
+        ss_dis = SsDisView(expected)
+        self.assertEqual(expected, ss_dis)
+        self.assertEqual(len(expected), len(ss_dis))
+        self.assertIn('1DBO_A', ss_dis)
+        self.assertEqual('MNIFEMLRID', ss_dis['104L_B']['sequence'])
+        with self.assertRaises(TypeError):
+            ss_dis['104L_B']['sequence'] = ''
+        with self.assertRaises(TypeError):
+            ss_dis['9XYZ_A'] = {}
+        with self.assertRaises(KeyError):
+            ss_dis['9XYZ_A']
+        return None
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Test lib.uni_index."""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from io import open
+
+from pdb.lib.uni_index import (
+    UNI_INDEX_NAME, UniProtIndex, Uni_Entry, read_uni_index,
+    write_uni_index)
+
+
+class TestUniProtIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        self.entries = {
+            'P00720': Uni_Entry(
+                offset=0, size=250, length=164,
+                fetched=int(time.time()), checksum='abc'),
+            'P25644': Uni_Entry(
+                offset=250, size=100, length=40,
+                fetched=100, checksum='def'),
+            'Q8NI70': Uni_Entry(
+                offset=-1, size=0, length=0, fetched=100, checksum='')
+        }
+        return None
+
+    def test_write_and_read_index_pass(self):
+        write_uni_index(self.entries, self.temp_dir)
+        index_fp = os.path.join(self.temp_dir, UNI_INDEX_NAME)
+        self.assertTrue(os.path.isfile(index_fp))
+        self.assertFalse(os.path.isfile(index_fp + '.tmp'))
+        self.assertEqual(self.entries, read_uni_index(self.temp_dir))
+        return None
+
+    def test_read_index_without_fetch_times_pass(self):
+        index_fp = os.path.join(self.temp_dir, UNI_INDEX_NAME)
+        with open(index_fp, 'w', encoding='utf-8') as index_fh:
+            index_fh.write('P00720\t0\t250\t164\n')
+        self.assertEqual(
+            {'P00720': Uni_Entry(
+                offset=0, size=250, length=164, fetched=0, checksum='')},
+            read_uni_index(self.temp_dir)
+        )
+        return None
+
+    def test_lookup_pass(self):
+        uni_index = UniProtIndex(self.temp_dir, self.entries)
+        self.assertFalse(uni_index.exists())
+        self.assertEqual(3, len(uni_index))
+        self.assertIn('P00720', uni_index)
+        self.assertNotIn('Q8NI70', uni_index)
+        self.assertTrue(uni_index.is_obsolete('Q8NI70'))
+        self.assertEqual(164, uni_index.length('P00720'))
+        with self.assertRaises(ValueError):
+            uni_index.length('Q8NI70')
+        with self.assertRaises(KeyError):
+            uni_index.length('P12345')
+        self.assertEqual(
+            {'P25644': self.entries['P25644']},
+            uni_index.entries(['P25644', 'P12345'])
+        )
+        self.assertEqual(
+            {'P12345'},
+            uni_index.ids_to_fetch(['P00720', 'Q8NI70', 'P12345']))
+        self.assertEqual(
+            {'P25644', 'Q8NI70', 'P12345'},
+            uni_index.ids_to_fetch(list(self.entries) + ['P12345'], 1))
+
+        uni_index.save()
+        self.assertTrue(uni_index.exists())
+        self.assertEqual(self.entries, read_uni_index(self.temp_dir))
+        return None
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
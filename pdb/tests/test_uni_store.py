@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Test lib.uni_store."""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from Bio import SeqIO
+from io import open
+
+from pdb.lib.uni_index import Uni_Entry, read_uni_index
+from pdb.lib.uni_store import (
+    UNI_STORE_NAME, UniProtStore, import_fasta_folder)
+
+
+class TestUniProtStore(unittest.TestCase):
+    def setUp(self):
+        this_dir = os.path.dirname(os.path.abspath(__file__))
+        self.uniprot_folder = os.path.join(this_dir, 'uniprot')
+        self.temp_dir = tempfile.mkdtemp(prefix='pdb-tests_')
+        self.uni_ids = ['P00669', 'P00720', 'P25644']
+        for uni_id in self.uni_ids:
+            shutil.copy(
+                os.path.join(self.uniprot_folder, uni_id + '.fasta'),
+                self.temp_dir
+            )
+        open(os.path.join(self.temp_dir, 'Q8NI70.fasta'), 'w').close()
+        return None
+
+    def _seqio_sequence(self, uni_id):
+        fasta_fp = os.path.join(self.uniprot_folder, uni_id + '.fasta')
+        with open(fasta_fp, 'r', encoding='utf-8') as fasta_fh:
+            return str(SeqIO.read(fasta_fh, 'fasta').seq)
+
+    def test_import_and_get_pass(self):
+        self.assertEqual(4, import_fasta_folder(self.temp_dir))
+        fetched = int(os.path.getmtime(
+            os.path.join(self.temp_dir, 'P00669.fasta')))
+        for uni_id in self.uni_ids:
+            os.remove(os.path.join(self.temp_dir, uni_id + '.fasta'))
+
+        with UniProtStore(self.temp_dir) as uni_store:
+            self.assertTrue(uni_store.exists())
+            for uni_id in self.uni_ids:
+                expected = self._seqio_sequence(uni_id)
+                self.assertIn(uni_id, uni_store)
+                self.assertEqual(expected, uni_store.get(uni_id))
+                self.assertEqual(len(expected), uni_store.length(uni_id))
+            self.assertNotIn('Q8NI70', uni_store)
+            self.assertTrue(uni_store.is_obsolete('Q8NI70'))
+            with self.assertRaises(ValueError):
+                uni_store.get('Q8NI70')
+            with self.assertRaises(KeyError):
+                uni_store.get('P12345')
+
+        entries = read_uni_index(self.temp_dir)
+        self.assertEqual(
+            Uni_Entry(
+                offset=0,
+                size=230,
+                length=150,
+                fetched=fetched,
+                checksum=hashlib.md5(
+                    self._seqio_sequence('P00669').encode('ascii')
+                ).hexdigest()
+            ),
+            entries['P00669']
+        )
+        self.assertEqual(0, import_fasta_folder(self.temp_dir))
+        return None
+
+    def test_put_replaces_record_pass(self):
+        with UniProtStore(self.temp_dir) as uni_store:
+            uni_store.put('P00001', '>sp|P00001|TEST\nMKV\nLL')
+            uni_store.put('P00002', '>sp|P00002|TEST\nAAAA\n')
+            self.assertEqual('MKVLL', uni_store.get('P00001'))
+            uni_store.put('P00001', '>sp|P00001|TEST\nMKVLLW\n')
+            uni_store.save()
+        with UniProtStore(self.temp_dir) as uni_store:
+            self.assertEqual('MKVLLW', uni_store.get('P00001'))
+            self.assertEqual(4, uni_store.length('P00002'))
+        with open(os.path.join(self.temp_dir, UNI_STORE_NAME), 'rb') as fh:
+            self.assertEqual(3, fh.read().count(b'>'))
+        return None
+
+    def test_ids_to_fetch_pass(self):
+        with UniProtStore(self.temp_dir) as uni_store:
+            uni_store.put('P00001', '>sp|P00001|TEST\nMKV\n', fetched=100)
+            uni_store.put('P00002', '>sp|P00002|TEST\nAAAA\n')
+            uni_store.put_obsolete('P00003', fetched=100)
+            uni_ids = ['P00001', 'P00002', 'P00003', 'P00004']
+            self.assertEqual(
+                {'P00004'}, uni_store.ids_to_fetch(uni_ids))
+            self.assertEqual(
+                {'P00001', 'P00003', 'P00004'},
+                uni_store.ids_to_fetch(uni_ids, max_age_days=1))
+
+            # An unchanged sequence only updates the fetch time.
+            uni_store.save()
+            size = os.path.getsize(uni_store.path)
+            uni_store.put('P00001', '>sp|P00001|TEST\nMKV\n')
+            uni_store.save()
+            self.assertEqual(size, os.path.getsize(uni_store.path))
+            self.assertEqual(
+                {'P00003'}, uni_store.ids_to_fetch(uni_ids[:3], 1))
+        return None
+
+    def test_non_ascii_header_pass(self):
+        fasta = '>sp|P00001|TEST Protéine OS=Escherichia coli\nMKVLL\n'
+        with open(os.path.join(self.temp_dir, 'P00001.fasta'), 'w',
+                  encoding='utf-8') as fasta_fh:
+            fasta_fh.write(fasta)
+        self.assertEqual(5, import_fasta_folder(self.temp_dir))
+        with UniProtStore(self.temp_dir) as uni_store:
+            self.assertEqual('MKVLL', uni_store.get('P00001'))
+            uni_store.put('P00002', fasta.replace('P00001', 'P00002'))
+            self.assertEqual('MKVLL', uni_store.get('P00002'))
+        return None
+
+    def test_legacy_files_pass(self):
+        uni_store = UniProtStore(self.temp_dir)
+        self.assertFalse(uni_store.exists())
+        self.assertEqual(
+            self._seqio_sequence('P00720'), uni_store.get('P00720'))
+        with self.assertRaises(ValueError):
+            uni_store.length('Q8NI70')
+        uni_store.close()
+        return None
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,7 @@ from pdb.lib.create_delimiter import create_delimiter
 from pdb.lib.create_pdb_intervals import create_intervals
 from pdb.lib.data_paths import ProjectFolders
 from pdb.lib.datetime_info import now_utc
-from pdb.lib.file_io import write_yaml, read_json
+from pdb.lib.file_io import find_frame, read_frame, write_yaml, read_json
 from pdb.lib.pdb_tools import uni_pdb_validation
 from pdb.lib.uni_tools import create_uni_struct
 
@@ -113,11 +113,11 @@ def uniprot_composite(dirs):
         dirs (ProjectFolders): A named tuple of directory paths.
 
     """
-    pdb_initial_composite_fp = os.path.join(
-        dirs.tsv_data,
-        'pdb_initial_composite_df.tsv'
-    )
-    assert os.path.isfile(pdb_initial_composite_fp)
+    pdb_initial_composite_fp = find_frame(
+        dirs.tsv_data, 'pdb_initial_composite_df')
+    if pdb_initial_composite_fp is None:
+        raise IOError(
+            "No pdb_initial_composite_df file in {}.".format(dirs.tsv_data))
 
     uni_folder_path = dirs.uni_data
     file_names = _create_composite_file_names()
@@ -136,13 +136,7 @@ def uniprot_composite(dirs):
         )
         return None
 
-    pdb_df = pd.read_csv(
-        pdb_initial_composite_fp,
-        sep='\t',
-        header=0,
-        encoding='utf-8',
-        keep_default_na=False,
-        na_values=['NULL', 'N/A'])
+    pdb_df = read_frame(pdb_initial_composite_fp)
 
     print("Creating the UniProt composite structure.")
     uni_df = create_uni_struct(pdb_df)